@@ -6,8 +6,12 @@ from api.models import *
 admin.site.register(User)
 admin.site.register(Client)
 admin.site.register(Payment)
+admin.site.register(ClientLedger)
+admin.site.register(RevokedToken)
 admin.site.register(Campaign)
+admin.site.register(CampaignDailyStat)
 admin.site.register(Product)
 admin.site.register(Page)
 admin.site.register(VoiceOver)
-admin.site.register(Creative)
\ No newline at end of file
+admin.site.register(Creative)
+admin.site.register(UploadSession)
\ No newline at end of file
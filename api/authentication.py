@@ -0,0 +1,141 @@
+from collections import OrderedDict
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.db.models import DEFERRED
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from api.models import Client, User
+
+
+def _changed_key(user_id):
+    return f'auth-user-changed:{user_id}'
+
+
+def _partial_instance(model, db, **values):
+    # A model instance with only the given columns; the others are deferred and
+    # loaded on first access
+    fields = model._meta.concrete_fields
+    return model.from_db(db, [field.attname for field in fields if field.attname in values], [values.get(field.attname, DEFERRED) for field in fields])
+
+
+class UserCache:
+    """
+    Bounded LRU of {user id: (expiry, role, is_active, client id)}. Entries live
+    AUTH_USER_CACHE_TTL seconds, which bounds how long another worker can serve
+    a user this process has not seen change.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1:]
+
+    def set(self, user_id, role, is_active, client_id):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + settings.AUTH_USER_CACHE_TTL, role, is_active, client_id)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > settings.AUTH_USER_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def token_claims(user):
+    # Claims CachedJWTAuthentication builds the user from; claims_at tells
+    # whether the user changed after they were read
+    client_id = Client.objects.filter(user=user).values_list('pk', flat=True).first()
+    return {
+        'role': user.role,
+        'client_id': str(client_id) if client_id else None,
+        'claims_at': int(time.time()),
+    }
+
+
+def _changed_timeout():
+    # Only access tokens are checked against it, refreshing reads the user
+    return int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+
+def invalidate_user(user_id):
+    # Record the change on the user row, drop the local entry and tell the
+    # other workers that tokens issued before now carry stale claims
+    user_id = str(user_id)
+    changed_at = timezone.now()
+    User.objects.filter(pk=user_id).update(claims_changed_at=changed_at)
+    user_cache.discard(user_id)
+    cache.set(_changed_key(user_id), int(changed_at.timestamp()), timeout=_changed_timeout())
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the per-request User query. The user is built
+    from the token's role/client_id claims when they are newer than the user's
+    claims_changed_at, as mirrored in the shared cache, and from the database
+    otherwise. The result is kept in a per-process LRU.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        entry = user_cache.get(user_id)
+        if entry is None:
+            entry = self.load(user_id, validated_token)
+            user_cache.set(user_id, *entry)
+        role, is_active, client_id = entry
+        if not is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return self.build_user(user_id, role, client_id)
+
+    def load(self, user_id, validated_token):
+        claims_at = validated_token.get('claims_at')
+        changed_at = cache.get(_changed_key(user_id))
+        if claims_at is not None and changed_at is not None and claims_at > changed_at:
+            return validated_token['role'], True, validated_token['client_id']
+        row = User.objects.filter(pk=user_id).values_list('role', 'is_active', 'client__id', 'claims_changed_at').first()
+        if row is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        role, is_active, client_id, changed_at = row
+        # The shared cache only mirrors User.claims_changed_at: an evicted key
+        # costs this query, it never makes stale claims valid
+        cache.add(_changed_key(user_id), int(changed_at.timestamp()) if changed_at else 0, timeout=_changed_timeout())
+        return role, is_active, str(client_id) if client_id else None
+
+    def build_user(self, user_id, role, client_id):
+        db = router.db_for_read(User)
+        user = _partial_instance(User, db, id=User._meta.pk.to_python(user_id), role=role, is_active=True)
+        client = None
+        if client_id:
+            client = _partial_instance(Client, db, id=Client._meta.pk.to_python(client_id), user_id=user.pk)
+            client._state.fields_cache['user'] = user
+        # Reverse one-to-one cache: user.client (or its DoesNotExist) needs no query
+        user._state.fields_cache['client'] = client
+        return user
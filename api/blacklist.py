@@ -0,0 +1,138 @@
+from datetime import datetime, timezone
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone as django_timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.authentication import token_claims
+from api.models import RevokedToken, User
+
+BLOOM_MIN_CAPACITY = 10_000
+BLOOM_ERROR_RATE = 0.001
+
+
+def _revoked_key(jti):
+    return f'revoked-jti:{jti}'
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing over one 128-bit digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class TokenBlacklist:
+    """
+    Revoked refresh token JTIs. RevokedToken rows are the durable record and are
+    pruned once their token has expired. Each process holds a Bloom filter of
+    them, rebuilt every TOKEN_BLACKLIST_RELOAD_SECONDS, and revocations made by
+    other workers since the last rebuild are found through a per-JTI key in
+    the shared cache. A check therefore never queries the database unless the
+    filter reports a match.
+    """
+
+    def __init__(self):
+        self._bloom = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _filter(self):
+        if self._bloom is None or time.monotonic() - self._loaded_at > settings.TOKEN_BLACKLIST_RELOAD_SECONDS:
+            with self._lock:
+                if self._bloom is None or time.monotonic() - self._loaded_at > settings.TOKEN_BLACKLIST_RELOAD_SECONDS:
+                    self.reload()
+        return self._bloom
+
+    def reload(self):
+        now = django_timezone.now()
+        RevokedToken.objects.filter(expires_at__lte=now).delete()
+        live = RevokedToken.objects.filter(expires_at__gt=now)
+        bloom = BloomFilter(max(BLOOM_MIN_CAPACITY, live.count() * 2))
+        for jti in live.values_list('jti', flat=True).iterator(chunk_size=2000):
+            bloom.add(jti)
+        self._bloom = bloom
+        self._loaded_at = time.monotonic()
+
+    def is_revoked(self, jti):
+        if jti in self._filter():
+            # A replayed token, or a false positive of the filter
+            return RevokedToken.objects.filter(jti=jti).exists()
+        return cache.get(_revoked_key(jti)) is not None
+
+    def revoke(self, jti, expires_at):
+        # The primary key makes this a compare-and-set: of two requests
+        # rotating the same token only the first one succeeds
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            raise TokenError('Token is blacklisted')
+        timeout = max(1, int((expires_at - django_timezone.now()).total_seconds()))
+        cache.set(_revoked_key(jti), 1, timeout=timeout)
+        bloom = self._filter()
+        with self._lock:
+            bloom.add(jti)
+
+
+token_blacklist = TokenBlacklist()
+
+
+class RevocableRefreshToken(RefreshToken):
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        if token_blacklist.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+
+    def blacklist(self):
+        expires_at = datetime.fromtimestamp(self.payload['exp'], tz=timezone.utc)
+        token_blacklist.revoke(self.payload[api_settings.JTI_CLAIM], expires_at)
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RevocableRefreshToken
+    # TokenRefreshSerializer only has this message from simplejwt 5.4
+    default_error_messages = {
+        'no_active_account': 'No active account found for the given token.',
+    }
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM]).only('id', 'role', 'is_active').first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        # The new tokens carry the user as it is now, not as it was at login
+        for claim, value in token_claims(user).items():
+            refresh[claim] = value
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
@@ -0,0 +1,29 @@
+import re
+
+
+# EXPLAIN lines reading a whole table: SQLite "SCAN <table>" without an index,
+# PostgreSQL "Seq Scan on <table>"
+FULL_SCAN_PATTERNS = (
+    re.compile(r'\bSCAN (?!CONSTANT ROW)(\S+)$'),
+    re.compile(r'\bSeq Scan on (\S+)'),
+)
+
+
+def full_table_scans(queryset):
+    """Return the tables `queryset` reads in full according to the database's query plan."""
+    tables = []
+    if queryset.query.is_empty():
+        # .none() never reaches the database
+        return tables
+    for line in queryset.explain().splitlines():
+        for pattern in FULL_SCAN_PATTERNS:
+            match = pattern.search(line.strip())
+            if match:
+                tables.append(match.group(1))
+    return tables
+
+
+def assert_no_full_scan(queryset):
+    tables = full_table_scans(queryset)
+    if tables:
+        raise AssertionError(f"Full table scan on {', '.join(tables)}:\n{queryset.query}\n{queryset.explain()}")
@@ -0,0 +1,55 @@
+from django.core.exceptions import ValidationError
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+
+class LookupFilter(BaseFilterBackend):
+    """
+    Filters on the view's filter_fields, {name: lookups}, from query parameters
+    such as ?status=Active or ?cpl__gt=5. Names can be annotations of the
+    view's queryset. Other parameters are ignored.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        filter_fields = getattr(view, 'filter_fields', {})
+        for param, value in request.query_params.items():
+            name, _, lookup = param.partition('__')
+            lookup = lookup or 'exact'
+            if lookup not in filter_fields.get(name, ()):
+                continue
+            if lookup == 'in':
+                value = value.split(',')
+            elif lookup == 'isnull':
+                value = value.lower() in ('1', 'true')
+            try:
+                queryset = queryset.filter(**{f'{name}__{lookup}': value})
+            except ValidationError as error:
+                raise serializers.ValidationError({param: error.messages})
+            except (ValueError, TypeError):
+                raise serializers.ValidationError({param: [f'Invalid value "{value}".']})
+        return queryset
+
+
+class KeyedOrderingFilter(OrderingFilter):
+    """
+    ?ordering=<field> over the view's ordering_fields, where a field can map to
+    the annotation actually sorted on (view.ordering_keys), and id is appended
+    so the order is total. Without ?ordering the view's cursor_ordering, or the
+    paginator's, applies.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        if not params:
+            return getattr(view, 'cursor_ordering', None)
+        keys = getattr(view, 'ordering_keys', {})
+        ordering = []
+        for term in params.split(','):
+            term = term.strip()
+            name = term.lstrip('-')
+            if name not in view.ordering_fields:
+                raise serializers.ValidationError({self.ordering_param: [f'Cannot order by "{name}".']})
+            ordering.append(term.replace(name, keys.get(name, name)))
+        if ordering[-1].lstrip('-') != 'id':
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return ordering
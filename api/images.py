@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> (bounding box, crop to fill the box)
+VARIANTS = {
+    'thumb': ((200, 200), True),
+    'medium': ((800, 800), False),
+}
+FORMATS = {
+    'webp': 'WEBP',
+    'jpg': 'JPEG',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2),
+                thread_name_prefix='image-variants',
+            )
+        return _executor
+
+
+def schedule_variants(product_id, image_name):
+    # Jobs only live in this process; the generate_image_variants command
+    # renders those lost in a restart
+    _get_executor().submit(_generate_in_worker, product_id, image_name)
+
+
+def _generate_in_worker(product_id, image_name):
+    try:
+        generate_variants(product_id, image_name)
+    except Exception:
+        logger.exception('Could not generate variants of %s for product %s', image_name, product_id)
+    finally:
+        # Worker threads keep their own connections; don't leak them
+        connections.close_all()
+
+
+def render_variants(storage, image_name, directory):
+    from PIL import Image, ImageOps
+
+    with storage.open(image_name) as f:
+        image = Image.open(f)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+
+    variants = {}
+    for name, (box, crop) in VARIANTS.items():
+        if crop:
+            resized = ImageOps.fit(image, box, Image.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail(box, Image.LANCZOS)
+        for extension, image_format in FORMATS.items():
+            output = resized
+            if image_format == 'JPEG' and output.mode not in ('RGB', 'L'):
+                output = output.convert('RGB')
+            buffer = BytesIO()
+            output.save(buffer, image_format, quality=82)
+            variants[f'{name}_{extension}'] = storage.save(os.path.join(directory, 'variants', f'{name}.{extension}'), ContentFile(buffer.getvalue()))
+    return variants
+
+
+def generate_variants(product_id, image_name):
+    from api.models import Product
+
+    # Many products share an image (the default one for a start); reuse variants
+    # already rendered for it
+    variants = Product.objects.filter(image=image_name).exclude(image_variants={}).values_list('image_variants', flat=True).first()
+    if not variants:
+        field = Product._meta.get_field('image')
+        variants = render_variants(field.storage, image_name, field.upload_to)
+    # Skip the write if the image was replaced while we were rendering
+    Product.objects.filter(pk=product_id, image=image_name).update(image_variants=variants)
+    return variants
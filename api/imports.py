@@ -0,0 +1,202 @@
+import csv
+import io
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from rest_framework import status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from api.models import Campaign, CampaignDailyStat
+from api.scopes import scope_queryset
+from api.views import CampaignStatPermission
+
+# Accepted header names, compared lower-cased, for each column
+COLUMNS = {
+    'name': ('campaign', 'campaign name', 'name'),
+    'platform': ('platform',),
+    'date': ('date', 'day', 'reporting date'),
+    'leads': ('leads', 'results'),
+    'amount_spent': ('amount_spent', 'amount spent', 'spend', 'amount spent (usd)'),
+}
+AMBIGUOUS = object()
+
+
+def _key(value):
+    return ' '.join((value or '').split()).lower()
+
+
+class RowError(ValueError):
+    pass
+
+
+class CampaignReportImport:
+    """
+    Applies an ad-platform CSV export to campaigns, one row at a time so the
+    file never has to fit in memory. Rows are matched by (name, platform), or
+    by name alone when the row has no platform and the name is unique, using
+    an index of the campaigns built up front.
+
+    Rows without a date carry cumulative totals: the last one per campaign is
+    written with Campaign.set_totals once the file is read, as today's
+    difference. Rows with a date go to CampaignDailyStat as they stream in.
+    Both move the totals through the daily stats. Each batch of `batch_size` rows is one transaction and also
+    updates the client ledgers. Only the first `max_errors` row errors are
+    kept.
+    """
+
+    def __init__(self, campaigns=None, batch_size=1000, max_errors=1000, default_platform='', dry_run=False):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.default_platform = default_platform
+        self.dry_run = dry_run
+        self.rows = self.matched = self.updated = self.error_count = 0
+        self.errors = []
+        self.by_name_platform = {}
+        self.by_name = {}
+        campaigns = Campaign.objects.all() if campaigns is None else campaigns
+        for pk, name, platform in campaigns.values_list('pk', 'name', 'platform').order_by().iterator(chunk_size=2000):
+            name, key = _key(name), (_key(name), _key(platform))
+            self.by_name_platform[key] = AMBIGUOUS if key in self.by_name_platform else pk
+            self.by_name[name] = AMBIGUOUS if name in self.by_name else pk
+
+    def run(self, text_file):
+        reader = csv.reader(text_file)
+        header = next(reader, None)
+        if header is None:
+            raise RowError('The file is empty.')
+        columns = self.map_columns(header)
+
+        totals, stats = {}, []
+        for line, values in enumerate(reader, start=2):
+            if not any(value.strip() for value in values):
+                continue
+            self.rows += 1
+            try:
+                row = self.parse(columns, values)
+            except RowError as error:
+                self.add_error(line, str(error))
+                continue
+            self.matched += 1
+            if row['date'] is None:
+                # Later rows for the same campaign win. Holding one row per
+                # campaign costs no more than the index, and each campaign is
+                # written once however often the file repeats it
+                totals[row['campaign_id']] = row
+            else:
+                stats.append(row)
+                if len(stats) >= self.batch_size:
+                    self.apply_stats(stats)
+                    stats = []
+        totals = list(totals.values())
+        for start in range(0, len(totals), self.batch_size):
+            self.apply_totals({row['campaign_id']: row for row in totals[start:start + self.batch_size]})
+        if stats:
+            self.apply_stats(stats)
+        return self
+
+    def map_columns(self, header):
+        header = [_key(name) for name in header]
+        columns = {}
+        for column, names in COLUMNS.items():
+            columns[column] = next((header.index(name) for name in names if name in header), None)
+        missing = [column for column in ('name', 'leads', 'amount_spent') if columns[column] is None]
+        if missing:
+            raise RowError(f"Missing column(s): {', '.join(missing)}.")
+        return columns
+
+    def parse(self, columns, values):
+        def value(column):
+            index = columns[column]
+            return values[index].strip() if index is not None and index < len(values) else ''
+
+        name = _key(value('name'))
+        platform = _key(value('platform') or self.default_platform)
+        if not name:
+            raise RowError('No campaign name.')
+        campaign_id = self.by_name_platform.get((name, platform)) if platform else self.by_name.get(name)
+        if campaign_id is AMBIGUOUS and platform:
+            raise RowError(f'Several campaigns are named "{value("name")}" on {value("platform") or self.default_platform}.')
+        if campaign_id is AMBIGUOUS:
+            raise RowError(f'Several campaigns are named "{value("name")}", add a platform column.')
+        if campaign_id is None:
+            raise RowError(f'No campaign "{value("name")}"' + (f' on {value("platform") or self.default_platform}.' if platform else '.'))
+
+        try:
+            leads = int(value('leads').replace(',', '') or 0)
+        except ValueError:
+            raise RowError(f'Invalid leads "{value("leads")}".')
+        try:
+            amount_spent = Decimal(value('amount_spent').replace(',', '').lstrip('$') or 0).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise RowError(f'Invalid amount spent "{value("amount_spent")}".')
+        if leads < 0 or amount_spent < 0:
+            raise RowError('Leads and amount spent cannot be negative.')
+
+        day = None
+        if value('date'):
+            try:
+                day = date.fromisoformat(value('date'))
+            except ValueError:
+                raise RowError(f'Invalid date "{value("date")}", expected YYYY-MM-DD.')
+        return {'campaign_id': campaign_id, 'date': day, 'leads': leads, 'amount_spent': amount_spent}
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'error': message})
+
+    def apply_totals(self, rows):
+        if self.dry_run:
+            self.updated += len(rows)
+        else:
+            self.updated += Campaign.set_totals(rows)
+
+    def apply_stats(self, rows):
+        if not self.dry_run:
+            CampaignDailyStat.upsert(rows)
+        self.updated += len(rows)
+
+    def summary(self):
+        return {
+            'rows': self.rows,
+            'matched': self.matched,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+class CampaignReportImportView(APIView):
+    """
+    POST a multipart "file" holding a platform CSV export (campaign, platform,
+    leads, amount_spent and optionally date columns), with an optional
+    "platform" for files without that column and "dry_run" to only validate.
+    Campaigns outside the user's scope never match.
+    """
+    parser_classes = (MultiPartParser,)
+    permission_classes = (IsAuthenticated, CampaignStatPermission)
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+        importer = CampaignReportImport(
+            campaigns=scope_queryset(Campaign.objects.all(), request.user),
+            default_platform=request.data.get('platform', ''),
+            dry_run=request.data.get('dry_run') in ('1', 'true', 'True'),
+        )
+        # Uploads over FILE_UPLOAD_MAX_MEMORY_SIZE are already on disk, and are
+        # decoded and parsed a line at a time from there
+        text_file = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            importer.run(text_file)
+        except RowError as error:
+            return Response({'file': [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+        except (UnicodeDecodeError, csv.Error) as error:
+            return Response({'file': [f'Not a UTF-8 CSV file: {error}'], **importer.summary()}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            text_file.detach()
+        return Response(importer.summary())
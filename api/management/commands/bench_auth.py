@@ -0,0 +1,59 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client as HTTPClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.authentication import CachedJWTAuthentication, user_cache
+from api.models import User
+from api.views import CustomTokenObtainPairSerializer
+
+
+class Command(BaseCommand):
+    help = "Requests per second and queries per request on an endpoint with JWTAuthentication and with CachedJWTAuthentication"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/api/products?page_size=5')
+        parser.add_argument('--email', help='User the requests authenticate as, default the first Client')
+        parser.add_argument('--requests', type=int, default=300, help='Requests per round')
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(email=options['email']) if options['email'] else User.objects.filter(role='Client').order_by('date_joined')
+        user = users.first()
+        if user is None:
+            raise CommandError('No user to authenticate as, pass --email.')
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        client = HTTPClient(HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_HOST=host)
+        view_class = resolve(options['url'].split('?')[0]).func.view_class
+
+        original = view_class.authentication_classes
+        try:
+            for authentication_class in (JWTAuthentication, CachedJWTAuthentication):
+                view_class.authentication_classes = (authentication_class,)
+                user_cache.clear()
+                response = client.get(options['url'])
+                if response.status_code != 200:
+                    raise CommandError(f"{options['url']} answered {response.status_code}")
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(options['url'])
+                # Before the next requests reset the query log
+                query_count = len(queries)
+                rates = []
+                for _ in range(options['rounds']):
+                    start = time.perf_counter()
+                    for _ in range(options['requests']):
+                        client.get(options['url'])
+                    rates.append(options['requests'] / (time.perf_counter() - start))
+                self.stdout.write(
+                    f'{authentication_class.__name__:>24}: median {statistics.median(rates):7.0f} req/s '
+                    f'over {options["rounds"]}x{options["requests"]} requests, {query_count} queries per request'
+                )
+        finally:
+            view_class.authentication_classes = original
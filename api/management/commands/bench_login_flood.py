@@ -0,0 +1,94 @@
+import statistics
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import resolve
+
+from api.management.commands.soak_requests import WSGIClient
+from api.models import User
+from api.views import CustomTokenObtainPairSerializer
+
+
+class Command(BaseCommand):
+    help = "API latency while /api/token is flooded with wrong passwords, with the login throttles and without them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/api/products?page_size=2', help='Endpoint whose latency is measured')
+        parser.add_argument('--email', help='User the measured requests authenticate as, default the first Admin')
+        parser.add_argument('--attackers', type=int, default=2, help='Threads posting logins, each from its own address')
+        parser.add_argument('--rate', type=float, default=10.0, help='Login attempts per second per attacker, whatever the answers')
+        parser.add_argument('--seconds', type=float, default=20.0, help='Length of each phase')
+        parser.add_argument('--warmup', type=float, default=30.0, help='Seconds of flood before latency is measured, to spend the buckets')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(email=options['email']) if options['email'] else User.objects.filter(role='Admin').order_by('date_joined')
+        user = users.first()
+        if user is None:
+            raise CommandError('No user to authenticate as, pass --email.')
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        api = WSGIClient(host, HTTP_AUTHORIZATION=f'Bearer {token}')
+        if api.get(options['url']) != 200:
+            raise CommandError(f"{options['url']} did not answer 200")
+
+        view_class = resolve('/api/token').func.view_class
+        original = view_class.throttle_classes
+        phases = (
+            ('no flood', original, 0),
+            ('flood, throttled', original, options['attackers']),
+            ('flood, unthrottled', (), options['attackers']),
+        )
+        try:
+            for number, (name, throttle_classes, attackers) in enumerate(phases):
+                view_class.throttle_classes = throttle_classes
+                # New addresses every phase, so no bucket is left from the last one
+                addresses = [f'10.{number}.0.{attacker}' for attacker in range(attackers)]
+                latencies, logins = self.run_phase(api, WSGIClient(host), addresses, options)
+                self.stdout.write(
+                    f'{name:>18}: p50 {statistics.median(latencies) * 1000:7.1f} ms  '
+                    f'p95 {statistics.quantiles(latencies, n=20)[-1] * 1000:7.1f} ms  over {len(latencies)} requests; '
+                    f"logins {', '.join(f'{code}: {count}' for code, count in sorted(logins.items())) or 'none'}"
+                )
+        finally:
+            view_class.throttle_classes = original
+
+    def run_phase(self, api, anonymous, addresses, options):
+        stop = threading.Event()
+        logins = {}
+        lock = threading.Lock()
+
+        def attack(address):
+            # Attempts are scheduled at a fixed rate. Each post is synchronous, so
+            # one that overruns its slot delays the next instead of overlapping it
+            next_at = time.perf_counter()
+            try:
+                while not stop.is_set():
+                    # A new email each time, as in credential stuffing, so only
+                    # the per-address bucket applies
+                    status = anonymous.post('/api/token', {'email': f'{uuid.uuid4().hex}@example.com', 'password': 'wrong'}, REMOTE_ADDR=address)
+                    with lock:
+                        logins[status] = logins.get(status, 0) + 1
+                    next_at += 1 / options['rate']
+                    stop.wait(max(0, next_at - time.perf_counter()))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=attack, args=(address,)) for address in addresses]
+        for thread in threads:
+            thread.start()
+        if threads:
+            time.sleep(options['warmup'])
+        latencies = []
+        deadline = time.perf_counter() + options['seconds']
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            api.get(options['url'])
+            latencies.append(time.perf_counter() - start)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return latencies, logins
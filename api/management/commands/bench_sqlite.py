@@ -0,0 +1,110 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SCHEMA = """
+CREATE TABLE payment (id INTEGER PRIMARY KEY, client INTEGER NOT NULL, amount REAL NOT NULL, created_at REAL NOT NULL);
+CREATE INDEX payment_client_created ON payment (client, created_at);
+CREATE TABLE ledger (client INTEGER PRIMARY KEY, paid REAL NOT NULL);
+"""
+
+
+class Command(BaseCommand):
+    help = "Compare SQLite read/write throughput with the default journal and with SQLITE_PRAGMAS, readers and writers running at once"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--clients', type=int, default=1000)
+        parser.add_argument('--rows', type=int, default=100_000, help='Payments in the table before the run')
+
+    def handle(self, *args, **options):
+        runs = (
+            # Django's defaults: rollback journal, sqlite3's 5s timeout
+            ('default', {}),
+            ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS),
+        )
+        for name, pragmas in runs:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.populate(path, options)
+                reads, writes, errors = self.run(path, pragmas, options)
+            seconds = options['seconds']
+            self.stdout.write(
+                f'{name:>15}: {reads / seconds:8.0f} reads/s  {writes / seconds:7.0f} writes/s  '
+                f'{errors} "database is locked" errors'
+            )
+
+    def populate(self, path, options):
+        connection = sqlite3.connect(path)
+        connection.executescript(SCHEMA)
+        clients = options['clients']
+        connection.executemany('INSERT INTO ledger VALUES (?, 0)', ((client,) for client in range(clients)))
+        connection.executemany(
+            'INSERT INTO payment (client, amount, created_at) VALUES (?, ?, ?)',
+            ((random.randrange(clients), random.random() * 100, time.time()) for _ in range(options['rows'])),
+        )
+        connection.commit()
+        connection.close()
+
+    def connect(self, path, pragmas):
+        connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        for name, value in pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def run(self, path, pragmas, options):
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['seconds']
+        clients = options['clients']
+
+        def count(key):
+            with lock:
+                counts[key] += 1
+
+        def read():
+            connection = self.connect(path, pragmas)
+            while time.perf_counter() < deadline:
+                client = random.randrange(clients)
+                try:
+                    # A client's recent payments and balance, as the list views read them
+                    connection.execute('SELECT id, amount FROM payment WHERE client = ? ORDER BY created_at DESC LIMIT 50', (client,)).fetchall()
+                    connection.execute('SELECT paid FROM ledger WHERE client = ?', (client,)).fetchone()
+                    count('reads')
+                except sqlite3.OperationalError:
+                    count('errors')
+            connection.close()
+
+        def write():
+            connection = self.connect(path, pragmas)
+            while time.perf_counter() < deadline:
+                client = random.randrange(clients)
+                amount = random.random() * 100
+                try:
+                    # A payment and its ledger update in one transaction, as Payment.save does
+                    connection.execute('BEGIN IMMEDIATE')
+                    connection.execute('INSERT INTO payment (client, amount, created_at) VALUES (?, ?, ?)', (client, amount, time.time()))
+                    connection.execute('UPDATE ledger SET paid = paid + ? WHERE client = ?', (amount, client))
+                    connection.execute('COMMIT')
+                    count('writes')
+                except sqlite3.OperationalError:
+                    if connection.in_transaction:
+                        connection.execute('ROLLBACK')
+                    count('errors')
+            connection.close()
+
+        threads = [threading.Thread(target=read) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=write) for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts['reads'], counts['writes'], counts['errors']
@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from api.models import uuid7
+
+
+class Command(BaseCommand):
+    help = "Compare insert throughput and index size of UUIDv4 and UUIDv7 primary keys in a SQLite table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows inserted per transaction')
+
+    def handle(self, *args, **options):
+        for name, generate in (('uuid4', uuid.uuid4), ('uuid7', uuid7)):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                seconds = self.insert(path, generate, options)
+                index_mb, size_mb = self.sizes(path)
+            self.stdout.write(
+                f"{name}: {options['rows'] / seconds:9.0f} rows/s  "
+                f"primary key index {index_mb:6.1f} MB  file {size_mb:6.1f} MB"
+            )
+
+    def insert(self, path, generate, options):
+        # char(32) keys, as Django stores UUIDField on SQLite
+        connection = sqlite3.connect(path)
+        connection.execute('CREATE TABLE item (id char(32) NOT NULL PRIMARY KEY, created_at REAL NOT NULL)')
+        rows, batch_size = options['rows'], options['batch_size']
+        start = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            now = time.time()
+            with connection:
+                connection.executemany('INSERT INTO item VALUES (?, ?)', ((generate().hex, now) for _ in range(min(batch_size, rows - offset))))
+        seconds = time.perf_counter() - start
+        connection.close()
+        return seconds
+
+    def sizes(self, path):
+        connection = sqlite3.connect(path)
+        page_size = connection.execute('PRAGMA page_size').fetchone()[0]
+        try:
+            # Pages of the primary key's B-tree, when SQLite has the dbstat table
+            pages = connection.execute("SELECT COUNT(*) FROM dbstat WHERE name = 'sqlite_autoindex_item_1'").fetchone()[0]
+        except sqlite3.OperationalError:
+            pages = 0
+        connection.close()
+        return pages * page_size / 2 ** 20, os.path.getsize(path) / 2 ** 20
@@ -0,0 +1,77 @@
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.test import APIRequestFactory
+
+from api.explain import full_table_scans
+from api.models import Client, User
+from api.urls import urlpatterns
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the queryset behind every list/detail view for every role and fail on full table scans"
+
+    def handle(self, *args, **options):
+        failures = checked = 0
+        for name, queryset in self.view_querysets():
+            checked += 1
+            tables = full_table_scans(queryset)
+            if tables:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"{name}: full scan on {', '.join(tables)}"))
+                self.stdout.write(queryset.explain())
+        if failures:
+            raise CommandError(f'{failures} of {checked} view queries fall back to a full table scan')
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} view queries, all use indexes'))
+
+    def view_querysets(self):
+        factory = APIRequestFactory()
+        for pattern in urlpatterns:
+            view_class = getattr(pattern.callback, 'view_class', None)
+            serializer_class = getattr(view_class, 'serializer_class', None)
+            if not hasattr(getattr(serializer_class, 'Meta', None), 'model'):
+                continue
+            detail = 'pk' in pattern.pattern.converters
+            # The default order, then every ?ordering the view accepts
+            orderings = [None] if detail else [None] + [f'-{field}' for field in getattr(view_class, 'ordering_fields', ())]
+            for role, _ in User.ROLES:
+                for ordering in orderings:
+                    yield from self.role_querysets(factory, pattern, view_class, detail, role, ordering)
+
+    def role_querysets(self, factory, pattern, view_class, detail, role, ordering):
+        view = view_class()
+        request = view.initialize_request(factory.get('/', {'ordering': ordering} if ordering else {}))
+        request.user = self.user_for(role)
+        view.request, view.args, view.format_kwarg = request, (), None
+        view.kwargs = {'pk': uuid.uuid4()} if detail else {}
+        try:
+            view.check_permissions(request)
+        except APIException:
+            return
+
+        queryset = view.filter_queryset(view.get_queryset())
+        name = f'{pattern.name} as {role}' + (f' ordered by {ordering}' if ordering else '')
+        if detail:
+            yield name, queryset.filter(pk=view.kwargs['pk'])
+            return
+        paginator = view.paginator
+        if paginator is None:
+            yield name, queryset
+            return
+        # First page, and a deep page as a cursor would request it
+        ordering = paginator.get_ordering(request, queryset, view)
+        queryset = queryset.order_by(*ordering)
+        yield name, queryset[:paginator.page_size]
+        key = ordering[0].lstrip('-')
+        lookup = 'lt' if ordering[0].startswith('-') else 'gt'
+        position = 0 if key in queryset.query.annotations else timezone.now()
+        yield f'{name} (deep page)', queryset.filter(**{f'{key}__{lookup}': position})[:paginator.page_size]
+
+    def user_for(self, role):
+        # Unsaved users are enough to build the querysets
+        user = User(id=uuid.uuid4(), role=role)
+        if role == 'Client':
+            Client(id=uuid.uuid4(), user=user)
+        return user
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import shutil
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Product, User, role_profile
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class Command(BaseCommand):
+    help = "Move legacy media files into the content-addressed layout, merging byte-identical copies"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='Number of files hashed in parallel')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be merged')
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            self.dedupe(executor, Product, 'image', options['dry_run'])
+            self.dedupe(executor, User, 'profile', options['dry_run'])
+
+    def pinned_names(self, model, field):
+        # Names the code refers to directly; their duplicates are merged into them
+        names = [field.default] if isinstance(field.default, str) else []
+        if model is User:
+            names += [role_profile(role) for role, _ in User.ROLES]
+        return [name for name in names if field.storage.exists(name)]
+
+    def dedupe(self, executor, model, field_name, dry_run):
+        field = model._meta.get_field(field_name)
+        storage = field.storage
+        directory = field.upload_to.rstrip('/')
+        if not storage.exists(directory):
+            return
+
+        pinned = self.pinned_names(model, field)
+        # Legacy files sit directly in the upload directory, content-addressed
+        # ones in its two-character subdirectories
+        with os.scandir(storage.path(directory)) as entries:
+            legacy = sorted(
+                f'{directory}/{entry.name}' for entry in entries
+                if entry.is_file() and not entry.name.startswith('.') and f'{directory}/{entry.name}' not in pinned
+            )
+        names = pinned + legacy
+        digests = dict(zip(names, executor.map(file_digest, map(storage.path, names))))
+
+        targets = {digests[name][0]: name for name in pinned}
+        renames = {}
+        for name in legacy:
+            digest = digests[name][0]
+            extension = os.path.splitext(name)[1].lower()
+            renames[name] = targets.setdefault(digest, f'{directory}/{digest[:2]}/{digest}{extension}')
+
+        # Put every blob in place before pointing rows at it, and only remove the
+        # old files once no row references them
+        reclaimed = 0
+        placed = set()
+        for name, target in renames.items():
+            target_path = storage.path(target)
+            if target in placed or os.path.exists(target_path):
+                reclaimed += digests[name][1]
+                continue
+            placed.add(target)
+            if not dry_run:
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                try:
+                    os.link(storage.path(name), target_path)
+                except OSError:
+                    shutil.copy2(storage.path(name), target_path)
+        self.stdout.write(
+            f'{model.__name__}.{field_name}: {len(legacy)} legacy files, '
+            f'{len(set(renames.values()))} distinct contents, {reclaimed} bytes of duplicates'
+        )
+        if dry_run or not renames:
+            return
+
+        items = list(renames.items())
+        for start in range(0, len(items), 500):
+            with transaction.atomic():
+                for name, target in items[start:start + 500]:
+                    model.objects.filter(**{field_name: name}).update(**{field_name: target})
+        list(executor.map(os.remove, map(storage.path, renames)))
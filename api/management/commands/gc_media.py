@@ -0,0 +1,170 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.utils import timezone
+
+from api.models import Product, UploadSession, User, role_profile
+
+# Also the number of names in one IN (...) lookup, so it stays under the 999
+# variables SQLite allowed per statement before 3.32
+BATCH_SIZE = 999
+
+
+class ReferenceIndex:
+    """
+    Set of referenced media names kept in a temporary SQLite file, so millions
+    of names don't have to fit in memory. Each thread gets its own connection.
+    """
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(suffix='.sqlite3', prefix='gc-media-')
+        os.close(fd)
+        self._local = threading.local()
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('CREATE TABLE refs (name TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    @property
+    def connection(self):
+        if not hasattr(self._local, 'connection'):
+            self._local.connection = sqlite3.connect(self.path, check_same_thread=False)
+        return self._local.connection
+
+    def add(self, names):
+        batch = []
+        for name in names:
+            batch.append((name,))
+            if len(batch) == BATCH_SIZE:
+                self.connection.executemany('INSERT OR IGNORE INTO refs VALUES (?)', batch)
+                batch = []
+        self.connection.executemany('INSERT OR IGNORE INTO refs VALUES (?)', batch)
+        self.connection.commit()
+
+    def missing(self, names):
+        placeholders = ','.join('?' * len(names))
+        found = {row[0] for row in self.connection.execute(f'SELECT name FROM refs WHERE name IN ({placeholders})', names)}
+        return [name for name in names if name not in found]
+
+    def close(self):
+        os.remove(self.path)
+
+
+class Command(BaseCommand):
+    help = "Remove media files that no row references any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='Number of directories scanned in parallel')
+        parser.add_argument('--min-age', type=int, default=3600, help='Keep files modified less than this many seconds ago')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.cutoff = time.time() - options['min_age']
+        self.index = ReferenceIndex()
+        try:
+            roots = self.collect_references()
+            removed, reclaimed = self.sweep(roots, options['workers'])
+        finally:
+            self.index.close()
+        if not self.dry_run:
+            expired = UploadSession.purge(timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL))
+            self.stdout.write(f'Removed {expired} expired upload sessions')
+        action = 'Would remove' if self.dry_run else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f'{action} {removed} unreferenced files, {reclaimed} bytes'))
+
+    def collect_references(self):
+        roots = {}
+        for model in apps.get_app_config('api').get_models():
+            for field in model._meta.concrete_fields:
+                if not isinstance(field, models.FileField):
+                    continue
+                directory = field.upload_to.rstrip('/')
+                roots[field.storage.path(directory)] = (field.storage, directory)
+                names = (
+                    model._base_manager.exclude(**{f'{field.name}__isnull': True}).exclude(**{field.name: ''})
+                    .values_list(field.name, flat=True).order_by().iterator(chunk_size=BATCH_SIZE)
+                )
+                self.index.add(names)
+                if isinstance(field.default, str):
+                    self.index.add([field.default])
+
+        self.index.add(role_profile(role) for role, _ in User.ROLES)
+        # Completed uploads not attached to a row yet, which UploadField still
+        # accepts until the session expires
+        self.index.add(
+            UploadSession.objects.filter(status='Complete').exclude(name='')
+            .values_list('name', flat=True).order_by().iterator(chunk_size=BATCH_SIZE)
+        )
+        variants = Product.objects.exclude(image_variants={}).values_list('image_variants', flat=True).order_by().iterator(chunk_size=BATCH_SIZE)
+        self.index.add(name for names in variants for name in names.values())
+        return roots.values()
+
+    def sweep(self, roots, workers):
+        removed = reclaimed = 0
+        # Each task scans one directory and returns its subdirectories, so only
+        # the directories waiting to be scanned are held in memory
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {executor.submit(self.scan, storage, storage.path(directory), directory) for storage, directory in roots}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    storage, subdirectories, count, size = future.result()
+                    removed += count
+                    reclaimed += size
+                    pending.update(executor.submit(self.scan, storage, path, name) for path, name in subdirectories)
+        return removed, reclaimed
+
+    def scan(self, storage, path, prefix):
+        subdirectories = []
+        removed = reclaimed = 0
+        batch = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    name = f'{prefix}/{entry.name}'
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append((entry.path, name))
+                    elif entry.is_file(follow_symlinks=False):
+                        batch.append((name, entry))
+                        if len(batch) == BATCH_SIZE:
+                            count, size = self.collect(batch)
+                            removed, reclaimed, batch = removed + count, reclaimed + size, []
+        except FileNotFoundError:
+            pass
+        count, size = self.collect(batch)
+        return storage, subdirectories, removed + count, reclaimed + size
+
+    def collect(self, batch):
+        if not batch:
+            return 0, 0
+        entries = dict(batch)
+        removed = reclaimed = 0
+        for name in self.index.missing(list(entries)):
+            try:
+                # Re-stat right before deleting: a fresh upload of the same
+                # content refreshes the mtime of the stored file
+                stat = os.stat(entries[name].path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > self.cutoff:
+                continue
+            if self.dry_run:
+                self.stdout.write(name)
+            else:
+                try:
+                    os.remove(entries[name].path)
+                except FileNotFoundError:
+                    continue
+            removed += 1
+            reclaimed += stat.st_size
+        return removed, reclaimed
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from api.images import generate_variants
+from api.models import Product
+
+
+class Command(BaseCommand):
+    help = "Render the image variants of products that have none, such as those whose job was lost in a restart"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the images that would be rendered')
+
+    def handle(self, *args, **options):
+        missing = Product.objects.filter(image_variants={}).exclude(image__isnull=True).exclude(image='')
+        rendered = failed = 0
+        # Products sharing an image share its variants, so each one is rendered once
+        for image_name in missing.values_list('image', flat=True).order_by('image').distinct().iterator():
+            if options['dry_run']:
+                self.stdout.write(image_name)
+                rendered += 1
+                continue
+            product_id = missing.filter(image=image_name).values_list('pk', flat=True).first()
+            if product_id is None:
+                # Replaced or rendered by a scheduled job meanwhile
+                continue
+            try:
+                variants = generate_variants(product_id, image_name)
+            except Exception as error:
+                self.stderr.write(f'{image_name}: {error!r}')
+                failed += 1
+                continue
+            missing.filter(image=image_name).update(image_variants=variants)
+            rendered += 1
+
+        action = 'Would render' if options['dry_run'] else 'Rendered'
+        self.stdout.write(self.style.SUCCESS(f'{action} variants of {rendered} images, {failed} failed'))
@@ -0,0 +1,41 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import CampaignReportImport, RowError
+
+
+class Command(BaseCommand):
+    help = "Apply an ad-platform spend report (CSV) to campaign leads and amount spent"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with campaign, platform, leads, amount_spent and optionally date columns')
+        parser.add_argument('--platform', default='', help='Platform of every row, for files without a platform column')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rows written per transaction')
+        parser.add_argument('--max-errors', type=int, default=1000, help='Number of row errors printed')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate and match the rows, do not write')
+
+    def handle(self, *args, **options):
+        importer = CampaignReportImport(
+            batch_size=options['batch_size'],
+            max_errors=options['max_errors'],
+            default_platform=options['platform'],
+            dry_run=options['dry_run'],
+        )
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as f:
+                importer.run(f)
+        except (OSError, RowError) as error:
+            raise CommandError(str(error))
+        except (UnicodeDecodeError, csv.Error) as error:
+            # Batches before the bad row are already written
+            raise CommandError(f'Not a UTF-8 CSV file: {error} ({importer.rows} rows read, {importer.updated} updated)')
+
+        for error in importer.errors:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        if importer.error_count > len(importer.errors):
+            self.stderr.write(f'... and {importer.error_count - len(importer.errors)} more errors')
+        action = 'Matched' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {importer.rows} rows: {action} {importer.updated}, {importer.error_count} errors'
+        ))
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import LEDGER_FIELDS, Client, ClientLedger
+
+
+class Command(BaseCommand):
+    help = "Rebuild ClientLedger rows from the Payment and Campaign history and report any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Number of clients reconciled per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report drift, do not write to the ledger')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+        checked = drifted = 0
+        last_pk = None
+
+        while True:
+            clients = Client.objects.order_by('pk')
+            if last_pk is not None:
+                clients = clients.filter(pk__gt=last_pk)
+            pks = list(clients.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+
+            with transaction.atomic():
+                # Lock the existing rows so concurrent payment/campaign saves wait for
+                # the rebuilt values instead of being overwritten by them
+                ledgers = ClientLedger.objects.filter(client_id__in=pks)
+                if not dry_run:
+                    ledgers = ledgers.select_for_update()
+                ledgers = {ledger.client_id: ledger for ledger in ledgers}
+                expected_rows = Client.objects.with_ledger_totals().filter(pk__in=pks).values('pk', 'user__email', *LEDGER_FIELDS)
+
+                to_create, to_update = [], []
+                for expected in expected_rows:
+                    expected['leads'] = int(expected['leads'])
+                    ledger = ledgers.get(expected['pk']) or ClientLedger(client_id=expected['pk'])
+                    drift = {
+                        field: (getattr(ledger, field), expected[field])
+                        for field in LEDGER_FIELDS
+                        if getattr(ledger, field) != expected[field]
+                    }
+                    if not drift:
+                        continue
+                    drifted += 1
+                    for field, (stored, value) in drift.items():
+                        self.stdout.write(f"{expected['user__email']}: {field} ledger={stored} recomputed={value}")
+                        setattr(ledger, field, value)
+                    if ledger.client_id in ledgers:
+                        ledger.updated_at = timezone.now()
+                        to_update.append(ledger)
+                    else:
+                        to_create.append(ledger)
+
+                if not dry_run:
+                    ClientLedger.objects.bulk_create(to_create)
+                    ClientLedger.objects.bulk_update(to_update, LEDGER_FIELDS + ('updated_at',))
+            checked += len(pks)
+
+        action = 'found' if dry_run else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} clients, {action} drift on {drifted}'))
@@ -0,0 +1,23 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from api.platform_stub import StubPlatformServer
+
+
+class Command(BaseCommand):
+    help = "Serve a local ad platform API for StubPlatformAdapter (PLATFORM_SYNC_STUB_URL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds each response waits')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of responses failing with 429 or 503')
+
+    def handle(self, *args, **options):
+        server = StubPlatformServer(options['host'], options['port'], options['latency'], options['error_rate'])
+        self.stdout.write(f"Serving the stub platform on http://{options['host']}:{options['port']}/v1/insights")
+        try:
+            asyncio.run(server.serve())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,126 @@
+import gc
+import io
+import json
+import resource
+import sys
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+
+from api.models import User
+from api.views import CustomTokenObtainPairSerializer
+
+
+def rss_mb():
+    # Current resident set size; ru_maxrss (the peak) where /proc is missing
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class WSGIClient:
+    """
+    Calls the WSGI application the way a server worker does. django.test.Client
+    is not used: it connects signal receivers on every request and grows by
+    about a kilobyte each time, which would swamp what is being measured.
+    """
+
+    def __init__(self, host, **headers):
+        self.application = get_wsgi_application()
+        self.host = host
+        self.headers = headers
+
+    def get(self, url, **headers):
+        return self.request('GET', url, **headers)
+
+    def post(self, url, data, **headers):
+        body = json.dumps(data).encode()
+        return self.request('POST', url, body, CONTENT_TYPE='application/json', CONTENT_LENGTH=str(len(body)), **headers)
+
+    def request(self, method, url, body=b'', **headers):
+        parts = urlsplit(url)
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': parts.path,
+            'QUERY_STRING': parts.query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_HOST': self.host,
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+            **self.headers,
+            **headers,
+        }
+        status = []
+        body = self.application(environ, lambda code, headers, exc_info=None: status.append(code))
+        try:
+            for _ in body:
+                pass
+        finally:
+            # Sends request_finished, as the server would
+            body.close()
+        return int(status[0].split()[0])
+
+
+class Command(BaseCommand):
+    help = "Send many authenticated requests through the WSGI application in this process and report its RSS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100_000)
+        parser.add_argument('--url', action='append', help='Path requested in turn (repeatable), default /api/products')
+        parser.add_argument('--email', help='User the requests authenticate as, default the first Admin')
+        parser.add_argument('--sample-every', type=int, default=10_000, help='Requests between RSS samples')
+        parser.add_argument('--warmup', type=int, default=1_000, help='Requests before the baseline sample')
+        parser.add_argument('--max-growth-mb', type=float, default=20.0, help='Fail when RSS grows more than this after the warmup')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(email=options['email']) if options['email'] else User.objects.filter(role='Admin').order_by('date_joined')
+        user = users.first()
+        if user is None:
+            raise CommandError('No user to authenticate as, pass --email.')
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        client = WSGIClient(host, HTTP_AUTHORIZATION=f'Bearer {token}')
+        urls = options['url'] or ['/api/products']
+
+        self.stdout.write(f"DEBUG={settings.DEBUG}, CONN_MAX_AGE={connection.settings_dict['CONN_MAX_AGE']}, cache {settings.CACHES['default']['BACKEND']}")
+        baseline = None
+        statuses = {}
+        start = time.perf_counter()
+        for sent in range(1, options['requests'] + 1):
+            status = client.get(urls[sent % len(urls)])
+            statuses[status] = statuses.get(status, 0) + 1
+            if sent == options['warmup']:
+                gc.collect()
+                baseline = rss_mb()
+                self.stdout.write(f'{sent:>9} requests  RSS {baseline:8.1f} MB  (baseline)')
+            elif sent % options['sample_every'] == 0:
+                self.stdout.write(f'{sent:>9} requests  RSS {rss_mb():8.1f} MB  {sent / (time.perf_counter() - start):7.0f} req/s')
+
+        gc.collect()
+        final = rss_mb()
+        self.stdout.write(f"Statuses: {', '.join(f'{code}: {count}' for code, count in sorted(statuses.items()))}")
+        if baseline is None:
+            return
+        growth = final - baseline
+        message = f'RSS grew {growth:.1f} MB over {options["requests"] - options["warmup"]} requests after the warmup'
+        if growth > options['max_growth_mb']:
+            raise CommandError(message)
+        self.stdout.write(self.style.SUCCESS(message))
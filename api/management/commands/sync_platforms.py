@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from api.models import Campaign
+from api.platform_sync import SyncEngine, get_adapter_class
+
+
+class Command(BaseCommand):
+    help = "Fetch campaign leads and amount spent from the ad platforms (PLATFORM_SYNC_ADAPTERS)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--platform', action='append', help='Only sync campaigns on this platform (repeatable)')
+        parser.add_argument('--status', help='Only sync campaigns with this status')
+        parser.add_argument('--adapter', help='Adapter class used for every campaign, e.g. api.platform_sync.StubPlatformAdapter')
+        parser.add_argument('--concurrency', type=int, help='Platform calls in flight at once')
+        parser.add_argument('--batch-size', type=int, help='Campaigns written per transaction')
+        parser.add_argument('--retries', type=int, help='Retries of a failed call')
+        parser.add_argument('--dry-run', action='store_true', help='Fetch but do not write')
+
+    def handle(self, *args, **options):
+        campaigns = Campaign.objects.exclude(platform=None).exclude(platform='')
+        if options['platform']:
+            campaigns = campaigns.filter(platform__in=options['platform'])
+        if options['status']:
+            campaigns = campaigns.filter(status=options['status'])
+
+        fixed_adapter = import_string(options['adapter']) if options['adapter'] else None
+        by_adapter, skipped = {}, set()
+        for pk, name, platform in campaigns.order_by('platform', 'pk').values_list('pk', 'name', 'platform').iterator(chunk_size=2000):
+            adapter_class = fixed_adapter or get_adapter_class(platform)
+            if adapter_class is None:
+                skipped.add(platform)
+                continue
+            by_adapter.setdefault(adapter_class, []).append((pk, name))
+        for platform in sorted(skipped):
+            self.stderr.write(f'No adapter for platform "{platform}", skipped')
+        if not by_adapter:
+            raise CommandError('No campaign to sync.')
+
+        start = time.perf_counter()
+        engine = SyncEngine(
+            concurrency=options['concurrency'],
+            retries=options['retries'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        ).run(by_adapter)
+        for pk, error in list(engine.errors.items())[:50]:
+            self.stderr.write(f'{pk}: {error}')
+        summary = engine.summary()
+        self.stdout.write(self.style.SUCCESS(
+            f"Fetched {summary['fetched']} campaigns in {time.perf_counter() - start:.1f}s "
+            f"({summary['retried']} retries): updated {summary['updated']}, {summary['errors']} errors"
+        ))
@@ -0,0 +1,139 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied
+from rest_framework.permissions import AllowAny
+from rest_framework.views import APIView
+
+from api.models import Payment
+
+# Names written by ContentAddressedStorage never change content
+HASHED_NAME_RE = re.compile(r'/([0-9a-f]{2})/\1[0-9a-f]{62}\.\w+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+PRIVATE_DIRECTORIES = ('payment_proofs/',)
+CHUNK_SIZE = 64 * 1024
+
+
+def _byte_range(header, size):
+    # (start, end) of a single "bytes=" range, None to send the whole file, or
+    # False when the range cannot be satisfied
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group() == 'bytes=-':
+        return None
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _clean_name(name):
+    # Only plain relative names: with "." or ".." segments the name checked
+    # for access would not be the file the storage resolves
+    if name.startswith('/') or posixpath.normpath(name) != name or name.split('/')[0] == '..':
+        raise Http404
+    return name
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class MediaView(APIView):
+    """
+    Serves MEDIA_ROOT. Payment proofs are only visible to their client and to
+    admins/managers. With MEDIA_SENDFILE set the transfer is handed to the front
+    proxy (nginx X-Accel-Redirect, or X-Sendfile for Apache/lighttpd); otherwise
+    the file is streamed with Range and ETag support. Content-hashed names are
+    cached as immutable.
+    """
+    permission_classes = (AllowAny,)
+
+    def get(self, request, name):
+        name = _clean_name(name)
+        self.check_access(request, name)
+        try:
+            path = default_storage.path(name)
+        except SuspiciousFileOperation:
+            raise Http404
+        private = name.startswith(PRIVATE_DIRECTORIES)
+        hashed = bool(HASHED_NAME_RE.search(name))
+        if hashed:
+            cache_control = f"{'private' if private else 'public'}, max-age=31536000, immutable"
+        else:
+            cache_control = f"{'private' if private else 'public'}, max-age=0, must-revalidate"
+
+        sendfile = getattr(settings, 'MEDIA_SENDFILE', '')
+        if sendfile:
+            response = HttpResponse(content_type=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+            if sendfile == 'x-accel-redirect':
+                response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(name)
+            else:
+                response['X-Sendfile'] = path
+            response['Cache-Control'] = cache_control
+            return response
+
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            raise Http404
+        if not os.path.isfile(path):
+            raise Http404
+        etag = quote_etag(os.path.basename(name) if hashed else f'{int(stat.st_mtime):x}-{stat.st_size:x}')
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            response = self.file_response(request, path, stat.st_size, etag)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Accept-Ranges'] = 'bytes'
+        response['Cache-Control'] = cache_control
+        return response
+
+    def file_response(self, request, path, size, etag):
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        byte_range = None
+        if 'HTTP_RANGE' in request.META and request.META.get('HTTP_IF_RANGE', etag) == etag:
+            byte_range = _byte_range(request.META['HTTP_RANGE'], size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is None:
+            return FileResponse(open(path, 'rb'), content_type=content_type)
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(path, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+        return response
+
+    def check_access(self, request, name):
+        if not name.startswith(PRIVATE_DIRECTORIES):
+            return
+        user = request.user
+        if not user or not user.is_authenticated:
+            raise NotAuthenticated()
+        if user.role in ('Admin', 'Manager'):
+            return
+        if user.role == 'Client' and Payment.objects.filter(proof=name, client__user=user).exists():
+            return
+        raise PermissionDenied()
@@ -0,0 +1,65 @@
+from contextlib import ExitStack
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class QueryTimingMiddleware:
+    """
+    Counts the SQL queries of each API request and their time in the database,
+    reported as Server-Timing and X-Query-Count response headers. Requests over
+    QUERY_BUDGET_COUNT queries or QUERY_BUDGET_MS of database time are logged.
+
+    Uses connection.execute_wrapper, so it does not depend on DEBUG.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.path_prefix = getattr(settings, 'QUERY_TIMING_PATH_PREFIX', '/api/')
+        self.query_budget = getattr(settings, 'QUERY_BUDGET_COUNT', None)
+        self.time_budget = getattr(settings, 'QUERY_BUDGET_MS', None)
+
+    def __call__(self, request):
+        if not request.path.startswith(self.path_prefix):
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = counter.duration * 1000
+
+        response['Server-Timing'] = f'db;dur={db_ms:.1f};desc="{counter.count} queries", app;dur={total_ms:.1f}'
+        response['X-Query-Count'] = str(counter.count)
+
+        over_count = self.query_budget is not None and counter.count > self.query_budget
+        over_time = self.time_budget is not None and db_ms > self.time_budget
+        if over_count or over_time:
+            match = request.resolver_match
+            view_name = (match.view_name or match._func_path) if match else request.path
+            logger.warning(
+                '%s %s (%s) ran %d queries in %.1fms of %.1fms',
+                request.method, request.path, view_name, counter.count, db_ms, total_ms,
+            )
+        return response
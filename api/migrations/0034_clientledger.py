@@ -0,0 +1,79 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:50
+
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def build_ledgers(apps, schema_editor):
+    Client = apps.get_model("api", "Client")
+    ClientLedger = apps.get_model("api", "ClientLedger")
+    Payment = apps.get_model("api", "Payment")
+    Campaign = apps.get_model("api", "Campaign")
+    payment_fields = {
+        "Ads Balance": "ads_paid",
+        "Leads Balance": "leads_paid",
+        "Wrong Orders": "wrong_orders_paid",
+    }
+    ledgers = []
+    for client in Client.objects.iterator():
+        totals = {"client": client}
+        approved = Payment.objects.filter(client=client, status="Approved")
+        for payment_type, field in payment_fields.items():
+            totals[field] = (
+                approved.filter(type=payment_type).aggregate(total=Sum("amount"))[
+                    "total"
+                ]
+                or 0
+            )
+        campaigns = Campaign.objects.filter(client=client).aggregate(
+            amount_spent=Sum("amount_spent"), leads=Sum("leads")
+        )
+        totals["amount_spent"] = campaigns["amount_spent"] or 0
+        totals["leads"] = campaigns["leads"] or 0
+        ledgers.append(ClientLedger(**totals))
+    ClientLedger.objects.bulk_create(ledgers, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0033_product_created_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClientLedger",
+            fields=[
+                (
+                    "client",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="ledger",
+                        serialize=False,
+                        to="api.client",
+                    ),
+                ),
+                (
+                    "ads_paid",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "leads_paid",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "wrong_orders_paid",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "amount_spent",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("leads", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(build_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0035_campaign_created_at_client_created_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="campaign",
+            index=models.Index(
+                fields=["created_at", "id"], name="campaign_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="campaign",
+            index=models.Index(
+                fields=["client", "created_at", "id"],
+                name="campaign_client_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="client",
+            index=models.Index(fields=["created_at", "id"], name="client_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="creative",
+            index=models.Index(
+                fields=["created_at", "id"], name="creative_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="creative",
+            index=models.Index(
+                fields=["status", "created_at", "id"],
+                name="creative_status_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="page",
+            index=models.Index(fields=["created_at", "id"], name="page_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="page",
+            index=models.Index(
+                fields=["status", "created_at", "id"], name="page_status_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(fields=["created_at", "id"], name="payment_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["client", "created_at", "id"], name="payment_client_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["client", "status", "type", "created_at"],
+                name="payment_client_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["created_at", "id"], name="product_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["client", "created_at", "id"], name="product_client_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["media_buyer", "created_at", "id"],
+                name="product_buyer_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(fields=["date_joined", "id"], name="user_joined_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["role", "date_joined", "id"], name="user_role_joined_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="voiceover",
+            index=models.Index(
+                fields=["created_at", "id"], name="voice_over_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="voiceover",
+            index=models.Index(
+                fields=["status", "created_at", "id"],
+                name="voice_over_status_created_idx",
+            ),
+        ),
+    ]
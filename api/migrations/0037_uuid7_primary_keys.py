@@ -0,0 +1,102 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:57
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0036_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="campaign",
+            name="id",
+            field=models.UUIDField(
+                default=api.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                unique=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="client",
+            name="id",
+            field=models.UUIDField(
+                default=api.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                unique=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="creative",
+            name="id",
+            field=models.UUIDField(
+                default=api.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                unique=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="page",
+            name="id",
+            field=models.UUIDField(
+                default=api.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                unique=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="id",
+            field=models.UUIDField(
+                default=api.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                unique=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="product",
+            name="id",
+            field=models.UUIDField(
+                default=api.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                unique=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="id",
+            field=models.UUIDField(
+                default=api.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                unique=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="voiceover",
+            name="id",
+            field=models.UUIDField(
+                default=api.models.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                unique=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:58
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0037_uuid7_primary_keys"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="profile",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                storage=api.storage.ContentAddressedStorage(),
+                upload_to="user_profiles/",
+            ),
+        ),
+    ]
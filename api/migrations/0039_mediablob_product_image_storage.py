@@ -0,0 +1,25 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:59
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0038_user_profile_storage"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="image",
+            field=models.FileField(
+                blank=True,
+                default="products/product_default.png",
+                null=True,
+                storage=api.storage.ContentAddressedStorage(),
+                upload_to="products/",
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.6 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0042_revokedtoken"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="campaign",
+            index=models.Index(
+                fields=["media_buyer", "created_at", "id"],
+                name="campaign_buyer_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="creative",
+            index=models.Index(
+                fields=["media_buyer", "created_at", "id"],
+                name="creative_buyer_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="creative",
+            index=models.Index(
+                fields=["creator", "created_at", "id"],
+                name="creative_creator_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="page",
+            index=models.Index(
+                fields=["media_buyer", "created_at", "id"],
+                name="page_buyer_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="page",
+            index=models.Index(
+                fields=["creator", "created_at", "id"], name="page_creator_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="voiceover",
+            index=models.Index(
+                fields=["media_buyer", "created_at", "id"],
+                name="voice_over_buyer_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="voiceover",
+            index=models.Index(
+                fields=["creator", "created_at", "id"],
+                name="voice_over_creator_created_idx",
+            ),
+        ),
+    ]
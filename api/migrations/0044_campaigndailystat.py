@@ -0,0 +1,56 @@
+# Generated by Django 4.2.6 on 2026-10-18 09:15
+
+import api.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0043_role_scope_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CampaignDailyStat",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=api.models.uuid7,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("leads", models.IntegerField(default=0)),
+                (
+                    "amount_spent",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=10),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "campaign",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="api.campaign",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["date", "id"], name="campaign_stat_date_idx")
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="campaigndailystat",
+            constraint=models.UniqueConstraint(
+                fields=("campaign", "date"), name="campaign_daily_stat_unique"
+            ),
+        ),
+    ]
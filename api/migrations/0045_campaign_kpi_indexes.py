@@ -0,0 +1,48 @@
+# Generated by Django 4.2.6 on 2026-10-18 09:34
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0044_campaigndailystat"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="campaign",
+            index=models.Index(
+                api.models.Ratio("amount_spent", "leads", default=-1),
+                models.F("id"),
+                name="campaign_cpl_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="campaign",
+            index=models.Index(
+                models.F("status"),
+                api.models.Ratio("amount_spent", "leads", default=-1),
+                models.F("id"),
+                name="campaign_status_cpl_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="campaign",
+            index=models.Index(
+                api.models.Ratio("amount_spent", "budget", default=-1),
+                models.F("id"),
+                name="campaign_utilization_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="campaign",
+            index=models.Index(
+                models.F("status"),
+                api.models.Ratio("amount_spent", "budget", default=-1),
+                models.F("id"),
+                name="campaign_status_util_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0045_campaign_kpi_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="claims_changed_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
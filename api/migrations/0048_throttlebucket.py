@@ -0,0 +1,30 @@
+# Generated by Django 4.2.6 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0047_user_claims_changed_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ThrottleBucket",
+            fields=[
+                (
+                    "key",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("tokens", models.FloatField()),
+                ("updated_at", models.FloatField()),
+                ("full_at", models.FloatField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["full_at"], name="throttle_bucket_full_idx")
+                ],
+            },
+        ),
+    ]
@@ -1,10 +1,32 @@
-from datetime import timezone
+from datetime import timedelta, timezone
+from decimal import Decimal
+from functools import partial
 import os
+import time
 import uuid
-from django.db import models
-from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.conf import settings
-from django.core.files import File
+from django.db import models, transaction
+from django.db.models import Case, Exists, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone as django_timezone
+from django.contrib.auth.models import AbstractUser, BaseUserManager
+from api.images import schedule_variants
+from api.storage import content_addressed_storage
+from api.table_versions import touch as touch_tables
+
+
+def uuid7():
+    # RFC 9562 version 7: 48-bit Unix millisecond timestamp followed by random
+    # bits, so new primary keys sort by creation time and append to the index
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), 'big')
+    value = value & ~(0xF << 76) | 0x7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+    return uuid.UUID(int=value)
+
+
+def role_profile(role):
+    # Shared default avatar of a role; users reference it rather than copy it
+    return f'user_profiles/{role.lower().replace(" ", "_")}.png'
 
 
 class CustomUserManager(BaseUserManager):
@@ -16,10 +38,8 @@ class CustomUserManager(BaseUserManager):
         user = self.model(email=email, **extra_fields)
         user.set_password(password)
         role = extra_fields.get('role')
-        if role:
-            profile = os.path.join(settings.BASE_DIR, f'user_profiles/{role.lower().replace(" ", "_")}.png')
-            with open(profile, 'rb') as photo_file:
-                user.profile.save(f'{user.email}_{role.lower().replace(" ", "_")}.png', File(profile), save=False)
+        if role and not extra_fields.get('profile'):
+            user.profile = role_profile(role)
         user.save(using=self._db)
         return user
 
@@ -47,11 +67,14 @@ class User(AbstractUser):
         ('Not Available', 'Not Available')
     ]
     
-    id = models.UUIDField(default=uuid.uuid4, primary_key=True, unique=True, editable=False)
+    id = models.UUIDField(default=uuid7, primary_key=True, unique=True, editable=False)
     email = models.EmailField(unique=True)
     role = models.CharField(max_length=30, choices=ROLES)
     status = models.CharField(max_length=30, choices=USER_STATUS, blank=True, null=True)
-    profile = models.FileField(upload_to='user_profiles/', blank=True, null=True)
+    profile = models.FileField(upload_to='user_profiles/', storage=content_addressed_storage, blank=True, null=True)
+    # Last change to the user or its client account; access tokens whose
+    # claims are older are checked against the database (api.authentication)
+    claims_changed_at = models.DateTimeField(blank=True, null=True, editable=False)
     username = None
 
     USERNAME_FIELD = 'email'
@@ -59,10 +82,77 @@ class User(AbstractUser):
 
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['date_joined', 'id'], name='user_joined_idx'),
+            models.Index(fields=['role', 'date_joined', 'id'], name='user_role_joined_idx'),
+        ]
+
+
+# Running totals kept on ClientLedger, and the Payment type feeding each one
+LEDGER_FIELDS = ('ads_paid', 'leads_paid', 'wrong_orders_paid', 'amount_spent', 'leads')
+LEDGER_PAYMENT_FIELDS = {
+    'Ads Balance': 'ads_paid',
+    'Leads Balance': 'leads_paid',
+    'Wrong Orders': 'wrong_orders_paid',
+}
+
+
+def _client_total(model, field, **filters):
+    # Correlated SUM over one client's rows, 0 when there are none
+    total = model.objects.filter(client=OuterRef('pk'), **filters).order_by().values('client').annotate(total=Sum(field)).values('total')
+    return Coalesce(Subquery(total), Value(Decimal(0)), output_field=models.DecimalField(max_digits=20, decimal_places=2))
+
+
+def _ledger_total(field):
+    return Coalesce(F(f'ledger__{field}'), Value(Decimal(0)), output_field=models.DecimalField(max_digits=20, decimal_places=2))
+
+
+class ClientQuerySet(models.QuerySet):
+    def with_ledger_totals(self):
+        # Recompute every ClientLedger column from the full Payment/Campaign history
+        return self.annotate(
+            ads_paid=_client_total(Payment, 'amount', status='Approved', type='Ads Balance'),
+            leads_paid=_client_total(Payment, 'amount', status='Approved', type='Leads Balance'),
+            wrong_orders_paid=_client_total(Payment, 'amount', status='Approved', type='Wrong Orders'),
+            amount_spent=_client_total(Campaign, 'amount_spent'),
+            leads=_client_total(Campaign, 'leads'),
+        )
+
+    def with_balances(self):
+        # Annotate ads_balance, leads_balance and membership from the client's
+        # ClientLedger row so a whole page of clients is a single SQL statement
+        month_start = django_timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        return self.select_related('user').annotate(
+            ads_balance=_ledger_total('ads_paid') - _ledger_total('amount_spent'),
+            leads_balance=(
+                _ledger_total('leads_paid')
+                + _ledger_total('wrong_orders_paid')
+                - _ledger_total('leads') * Coalesce('commission', Value(Decimal(0)))
+            ),
+            membership=Exists(Payment.objects.filter(
+                client=OuterRef('pk'),
+                status='Approved',
+                type='Membership',
+                created_at__gte=month_start,
+                created_at__lt=next_month,
+            )),
+        )
+
+
 class Client(models.Model):
-    id = models.UUIDField(default=uuid.uuid4, primary_key=True, unique=True, editable=False)
+    id = models.UUIDField(default=uuid7, primary_key=True, unique=True, editable=False)
     user = models.OneToOneField(User, limit_choices_to={'role': 'Client'}, on_delete=models.CASCADE)
     commission = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ClientQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='client_created_idx'),
+        ]
 
     def create_client(self, email, password, **extra_fields):
         # Set the role to 'Client' by default
@@ -101,12 +191,14 @@ class Product(models.Model):
         ('Published', 'Published'),
     ]
 
-    id = models.UUIDField(default=uuid.uuid4, primary_key=True, unique=True, editable=False)
+    id = models.UUIDField(default=uuid7, primary_key=True, unique=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     client = models.ForeignKey(Client, blank=True, null=True, on_delete=models.SET_NULL, related_name="product_client")
     media_buyer = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, limit_choices_to={'role': 'Media Buyer'}, related_name="product_media_buyer")
     name = models.CharField(max_length=100, blank=True, null=True)
-    image = models.FileField(upload_to='products/', default='products/product_default.png', blank=True, null=True)
+    image = models.FileField(upload_to='products/', storage=content_addressed_storage, default='products/product_default.png', blank=True, null=True)
+    # Resized copies of image, filled in by api.images after each upload
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     link = models.CharField(max_length=255, blank=True, null=True)
     type = models.CharField(max_length=20, blank=True, null=True, choices=PRODUCT_TYPES)
     sourcing_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
@@ -121,12 +213,94 @@ class Product(models.Model):
     decision = models.CharField(max_length=30, blank=True, null=True)
     status = models.CharField(max_length=30, blank=True, null=True, choices=PRODUCT_STATUS, default="New")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+            models.Index(fields=['client', 'created_at', 'id'], name='product_client_created_idx'),
+            models.Index(fields=['media_buyer', 'created_at', 'id'], name='product_buyer_created_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The image as loaded, so save() only queries the stored one when it
+        # was reassigned
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if not self._state.adding and (
+            (update_fields is not None and 'image' not in update_fields)
+            or 'image' in self.get_deferred_fields()
+            or self.image.name == getattr(self, '_loaded_image', models.DEFERRED)
+        ):
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            previous = None if self._state.adding else Product.objects.filter(pk=self.pk).values_list('image', flat=True).first()
+            image_changed = self.image.name != previous
+            if image_changed:
+                self.image_variants = {}
+            super().save(*args, **kwargs)
+            self._loaded_image = self.image.name
+            if image_changed and self.image.name:
+                # Resize after the upload is committed, off the request thread.
+                # A job lost in a restart leaves image_variants empty, which
+                # generate_image_variants fills in
+                transaction.on_commit(partial(schedule_variants, self.pk, self.image.name))
+
+
+class Ratio(models.Func):
+    """
+    numerator / denominator as a float; NULL, or `default`, when the
+    denominator is 0 or NULL. Constants are written into the SQL rather than
+    passed as parameters so an index on the same expression can serve it.
+    """
+    output_field = models.FloatField()
+
+    def __init__(self, numerator, denominator, default=None):
+        super().__init__(numerator, denominator)
+        self.default = default
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, template='(%(expressions)s, 0))', arg_joiner=' * 1.0 / NULLIF(', **extra_context)
+        if self.default is not None:
+            sql = f'COALESCE({sql}, {float(self.default)!r})'
+        return sql, params
+
+
+class DaysBetween(models.Func):
+    # Whole days from the second date to the first
+    output_field = models.IntegerField()
+    arg_joiner = ' - '
+    template = '(%(expressions)s)'
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='CAST(julianday(%(expressions)s) AS INTEGER)', arg_joiner=') - julianday(', **extra_context)
+
+
+class CampaignQuerySet(models.QuerySet):
+    def with_kpis(self):
+        # Cost per lead, share of the budget spent and days since the start (to
+        # the end date once there is one), computed in SQL so lists can be
+        # filtered and sorted on them. The *_order twins are never NULL, for
+        # cursor pagination: campaigns without a value sort below every other.
+        return self.annotate(
+            cpl=Ratio('amount_spent', 'leads'),
+            budget_utilization=Ratio('amount_spent', 'budget'),
+            days_running=DaysBetween(Coalesce('ended_date', Value(django_timezone.localdate())), 'started_date'),
+            cpl_order=Ratio('amount_spent', 'leads', default=-1),
+            budget_utilization_order=Ratio('amount_spent', 'budget', default=-1),
+        )
+
 
 class Campaign(models.Model):
-    id = models.UUIDField(default=uuid.uuid4, primary_key=True, unique=True, editable=False)
+    id = models.UUIDField(default=uuid7, primary_key=True, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
     client = models.ForeignKey(Client, blank=True, null=True, on_delete=models.SET_NULL, related_name="campaign_client")
     media_buyer = models.ForeignKey(User, blank=True, null=True, limit_choices_to={'role': 'Media Buyer'}, on_delete=models.SET_NULL, related_name="campaign_media_buyer")
     product = models.ForeignKey(Product, blank=True, null=True, on_delete=models.SET_NULL)
@@ -139,9 +313,169 @@ class Campaign(models.Model):
     leads = models.IntegerField(blank=True, null=True)
     amount_spent = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
 
+    objects = CampaignQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='campaign_created_idx'),
+            models.Index(fields=['client', 'created_at', 'id'], name='campaign_client_created_idx'),
+            models.Index(fields=['media_buyer', 'created_at', 'id'], name='campaign_buyer_created_idx'),
+            # Sorted KPI lists (CampaignQuerySet.with_kpis), overall and per status
+            models.Index(Ratio('amount_spent', 'leads', default=-1), F('id'), name='campaign_cpl_idx'),
+            models.Index(F('status'), Ratio('amount_spent', 'leads', default=-1), F('id'), name='campaign_status_cpl_idx'),
+            models.Index(Ratio('amount_spent', 'budget', default=-1), F('id'), name='campaign_utilization_idx'),
+            models.Index(F('status'), Ratio('amount_spent', 'budget', default=-1), F('id'), name='campaign_status_util_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    def ledger_entry(self):
+        # What this campaign adds to its client's ClientLedger row
+        return {'amount_spent': self.amount_spent or 0, 'leads': self.leads or 0}
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None if self._state.adding else Campaign.objects.filter(pk=self.pk).only('client', 'amount_spent', 'leads').first()
+            super().save(*args, **kwargs)
+            ClientLedger.record(previous, self)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            ClientLedger.record(self, None)
+        return result
+
+    @classmethod
+    def set_totals(cls, totals, day=None):
+        """
+        Bring leads/amount_spent to {campaign id: {'leads', 'amount_spent'}}
+        by writing the difference into each campaign's CampaignDailyStat row
+        for `day` (today by default), so the stats keep adding up to the
+        totals and later daily rows move them from there. Campaigns already
+        holding those values are skipped; returns the number updated.
+        """
+        day = day or django_timezone.localdate()
+        with transaction.atomic():
+            campaigns = cls.objects.select_for_update().filter(pk__in=totals).order_by('pk').values_list('pk', 'leads', 'amount_spent')
+            stats = {
+                campaign_id: (leads, amount_spent)
+                for campaign_id, leads, amount_spent in CampaignDailyStat.objects.filter(campaign_id__in=totals, date=day).values_list('campaign_id', 'leads', 'amount_spent')
+            }
+            rows = []
+            for pk, leads, amount_spent in campaigns:
+                row = totals[pk]
+                if (leads, amount_spent) == (row['leads'], row['amount_spent']):
+                    continue
+                day_leads, day_amount_spent = stats.get(pk, (0, Decimal(0)))
+                rows.append({
+                    'campaign_id': pk,
+                    'date': day,
+                    'leads': day_leads + row['leads'] - (leads or 0),
+                    'amount_spent': day_amount_spent + row['amount_spent'] - (amount_spent or 0),
+                })
+            # Moves the campaign totals and the client ledgers by the same
+            # differences
+            CampaignDailyStat.upsert(rows)
+        return len(rows)
+
+
+class CampaignDailyStat(models.Model):
+    # One day of a campaign's performance; Campaign.leads/amount_spent are kept
+    # equal to the sum of these rows (plus anything entered by hand), including
+    # the absolute totals written through Campaign.set_totals
+    id = models.UUIDField(default=uuid7, primary_key=True, unique=True, editable=False)
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name="daily_stats")
+    date = models.DateField()
+    leads = models.IntegerField(default=0)
+    amount_spent = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    UPSERT_BATCH_SIZE = 500
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'date'], name='campaign_daily_stat_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'id'], name='campaign_stat_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.campaign_id} {self.date}'
+
+    @classmethod
+    def upsert(cls, rows):
+        """
+        Insert or overwrite (campaign_id, date, leads, amount_spent) rows in
+        batches and move the campaign and ledger totals by the difference.
+        Returns the number of rows created and updated.
+        """
+        latest = {}
+        for row in rows:
+            latest[row['campaign_id'], row['date']] = row
+        rows = list(latest.values())
+        created = updated = 0
+        for start in range(0, len(rows), cls.UPSERT_BATCH_SIZE):
+            batch_created, batch_updated = cls._upsert_batch(rows[start:start + cls.UPSERT_BATCH_SIZE])
+            created += batch_created
+            updated += batch_updated
+        return created, updated
+
+    @classmethod
+    def _upsert_batch(cls, rows):
+        campaign_ids = sorted({row['campaign_id'] for row in rows})
+        with transaction.atomic():
+            # Locking the campaigns serialises concurrent uploads for them, so
+            # the previous values read below are the ones being overwritten
+            clients = dict(Campaign.objects.select_for_update().filter(pk__in=campaign_ids).order_by('pk').values_list('pk', 'client_id'))
+            dates = {row['date'] for row in rows}
+            previous = {
+                (stat['campaign_id'], stat['date']): stat
+                for stat in cls.objects.filter(campaign_id__in=campaign_ids, date__in=dates).values('campaign_id', 'date', 'leads', 'amount_spent')
+            }
+
+            now = django_timezone.now()
+            cls.objects.bulk_create(
+                [cls(campaign_id=row['campaign_id'], date=row['date'], leads=row['leads'], amount_spent=row['amount_spent'], updated_at=now) for row in rows],
+                update_conflicts=True,
+                unique_fields=['campaign', 'date'],
+                update_fields=['leads', 'amount_spent', 'updated_at'],
+            )
+
+            deltas = {}
+            for row in rows:
+                old = previous.get((row['campaign_id'], row['date']), {'leads': 0, 'amount_spent': 0})
+                delta = deltas.setdefault(row['campaign_id'], {'leads': 0, 'amount_spent': 0})
+                delta['leads'] += row['leads'] - old['leads']
+                delta['amount_spent'] += row['amount_spent'] - old['amount_spent']
+            deltas = {campaign_id: delta for campaign_id, delta in deltas.items() if delta['leads'] or delta['amount_spent']}
+            if deltas:
+                # One UPDATE for the whole batch
+                Campaign.objects.filter(pk__in=deltas).update(
+                    leads=Coalesce('leads', 0) + Case(
+                        *[When(pk=pk, then=Value(delta['leads'])) for pk, delta in deltas.items()],
+                        output_field=models.IntegerField(),
+                    ),
+                    amount_spent=Coalesce('amount_spent', Value(Decimal(0))) + Case(
+                        *[When(pk=pk, then=Value(delta['amount_spent'])) for pk, delta in deltas.items()],
+                        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+                    ),
+                )
+            ledger_deltas = {}
+            for campaign_id, delta in deltas.items():
+                client_id = clients[campaign_id]
+                if client_id is not None:
+                    totals = ledger_deltas.setdefault(client_id, {'leads': 0, 'amount_spent': 0})
+                    totals['leads'] += delta['leads']
+                    totals['amount_spent'] += delta['amount_spent']
+            for client_id, totals in ledger_deltas.items():
+                ClientLedger.apply(client_id, totals)
+            # Neither bulk_create nor update() send post_save
+            touch_tables(cls, Campaign)
+        updated = sum((row['campaign_id'], row['date']) in previous for row in rows)
+        return len(rows) - updated, updated
+
     
 class Payment(models.Model):
     PAYMENT_TYPES = [
@@ -157,7 +491,7 @@ class Payment(models.Model):
         ('Not Approved', 'Not Approved')
     ]
 
-    id = models.UUIDField(default=uuid.uuid4, primary_key=True, unique=True, editable=False)
+    id = models.UUIDField(default=uuid7, primary_key=True, unique=True, editable=False)
     client = models.ForeignKey(Client, blank=True, null=True, on_delete=models.CASCADE, related_name="payment_client")
     amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     proof = models.FileField(upload_to='payment_proofs/', blank=True, null=True)
@@ -165,9 +499,86 @@ class Payment(models.Model):
     status = models.CharField(max_length=20, choices=APPROVAL_STATUS, default="Waiting Approval", blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='payment_created_idx'),
+            models.Index(fields=['client', 'created_at', 'id'], name='payment_client_created_idx'),
+            # Membership check and ledger totals
+            models.Index(fields=['client', 'status', 'type', 'created_at'], name='payment_client_status_idx'),
+        ]
+
+    def __str__(self):
+        return self.client.user.email
+
+    def ledger_entry(self):
+        # What this payment adds to its client's ClientLedger row
+        field = LEDGER_PAYMENT_FIELDS.get(self.type)
+        if self.status != 'Approved' or field is None:
+            return {}
+        return {field: self.amount or 0}
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None if self._state.adding else Payment.objects.filter(pk=self.pk).only('client', 'amount', 'type', 'status').first()
+            super().save(*args, **kwargs)
+            ClientLedger.record(previous, self)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            ClientLedger.record(self, None)
+        return result
+
+
+class ClientLedger(models.Model):
+    client = models.OneToOneField(Client, primary_key=True, on_delete=models.CASCADE, related_name="ledger")
+    ads_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    leads_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    wrong_orders_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    amount_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    leads = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return self.client.user.email
 
+    @classmethod
+    def record(cls, old, new):
+        # Apply the difference between two versions of a Payment or Campaign row
+        # (None for a created or deleted row) to the affected ledgers
+        changes = {}
+        for row, sign in ((old, -1), (new, 1)):
+            if row is None or row.client_id is None:
+                continue
+            deltas = changes.setdefault(row.client_id, {})
+            for field, value in row.ledger_entry().items():
+                deltas[field] = deltas.get(field, 0) + sign * value
+        for client_id, deltas in changes.items():
+            cls.apply(client_id, deltas)
+
+    @classmethod
+    def apply(cls, client_id, deltas):
+        deltas = {field: value for field, value in deltas.items() if value}
+        if not deltas:
+            return
+        updated = cls.objects.filter(client_id=client_id).update(
+            updated_at=django_timezone.now(),
+            **{field: F(field) + value for field, value in deltas.items()}
+        )
+        if not updated:
+            # First change for this client: build the row from its history,
+            # which already includes the change being recorded
+            cls.rebuild(client_id)
+
+    @classmethod
+    def rebuild(cls, client_id):
+        totals = Client.objects.with_ledger_totals().filter(pk=client_id).values(*LEDGER_FIELDS).first()
+        if totals is None:
+            return None
+        totals['leads'] = int(totals['leads'])
+        ledger, _ = cls.objects.update_or_create(client_id=client_id, defaults=totals)
+        return ledger
+
 
 STATUS = [
     ('To Do', 'To Do'),
@@ -187,7 +598,7 @@ class Page(models.Model):
         ('Landing Page', 'Landing Page')
     ]
 
-    id = models.UUIDField(default=uuid.uuid4, primary_key=True, unique=True, editable=False)
+    id = models.UUIDField(default=uuid7, primary_key=True, unique=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     media_buyer = models.ForeignKey(User, blank=True, null=True, on_delete=models.SET_NULL, limit_choices_to={'role': 'Media Buyer'}, related_name="page_media_buyer")
     creator = models.ForeignKey(User, blank=True, null=True, on_delete=models.SET_NULL, limit_choices_to={'role': 'Page Builder'},  related_name="page_creator")
@@ -199,12 +610,21 @@ class Page(models.Model):
     final_link = models.CharField(max_length=255, blank=True, null=True)
     note = models.CharField(max_length=255, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='page_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='page_status_created_idx'),
+            # Role scopes in api.scopes
+            models.Index(fields=['media_buyer', 'created_at', 'id'], name='page_buyer_created_idx'),
+            models.Index(fields=['creator', 'created_at', 'id'], name='page_creator_created_idx'),
+        ]
+
     def __str__(self):
         return self.product.name
 
 
 class VoiceOver(models.Model):
-    id = models.UUIDField(default=uuid.uuid4, primary_key=True, unique=True, editable=False)
+    id = models.UUIDField(default=uuid7, primary_key=True, unique=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     media_buyer = models.ForeignKey(User, blank=True, null=True, on_delete=models.SET_NULL, limit_choices_to={'role': 'Media Buyer'}, related_name="voice_over_media_buyer")
     creator = models.ForeignKey(User, blank=True, null=True, on_delete=models.SET_NULL, limit_choices_to={'role': 'Voice Over'}, related_name="voice_over_creator")
@@ -215,6 +635,15 @@ class VoiceOver(models.Model):
     final_link = models.CharField(max_length=255, blank=True, null=True)
     note = models.CharField(max_length=255, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='voice_over_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='voice_over_status_created_idx'),
+            # Role scopes in api.scopes
+            models.Index(fields=['media_buyer', 'created_at', 'id'], name='voice_over_buyer_created_idx'),
+            models.Index(fields=['creator', 'created_at', 'id'], name='voice_over_creator_created_idx'),
+        ]
+
     def __str__(self):
         return self.product.name
 
@@ -227,7 +656,7 @@ class Creative(models.Model):
         ('Vertical (4:5)', 'Vertical (4:5)')
     ]
 
-    id = models.UUIDField(default=uuid.uuid4, primary_key=True, unique=True, editable=False)
+    id = models.UUIDField(default=uuid7, primary_key=True, unique=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     media_buyer = models.ForeignKey(User, blank=True, null=True, on_delete=models.SET_NULL, limit_choices_to={'role': 'Media Buyer'}, related_name="creative_media_buyer")
     creator = models.ForeignKey(User, blank=True, null=True, on_delete=models.SET_NULL, limit_choices_to={'role': 'Video Editor'}, related_name="creative_creator")
@@ -240,5 +669,108 @@ class Creative(models.Model):
     final_link = models.CharField(max_length=255, blank=True, null=True)
     note = models.CharField(max_length=255, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='creative_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='creative_status_created_idx'),
+            # Role scopes in api.scopes
+            models.Index(fields=['media_buyer', 'created_at', 'id'], name='creative_buyer_created_idx'),
+            models.Index(fields=['creator', 'created_at', 'id'], name='creative_creator_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.product.name
+
+
+class RevokedToken(models.Model):
+    # JTI of a refresh token that was rotated or revoked, kept until the token
+    # expires; api.blacklist holds a Bloom filter of these rows in memory
+    jti = models.CharField(max_length=64, primary_key=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='revoked_token_expires_idx'),
+        ]
+
+    def __str__(self):
+        return self.jti
+
+
+class ThrottleBucket(models.Model):
+    # Token bucket of api.throttling for one scope and client. Once full_at
+    # passes the bucket is full again and the row says nothing, so it is pruned
+    key = models.CharField(max_length=100, primary_key=True)
+    tokens = models.FloatField()
+    updated_at = models.FloatField()
+    full_at = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['full_at'], name='throttle_bucket_full_idx'),
+        ]
+
     def __str__(self):
-        return self.product.name
\ No newline at end of file
+        return self.key
+
+
+class UploadSession(models.Model):
+    # A file sent in ranged chunks to a temporary file, then stored and
+    # referenced from a Payment or Product by the session id
+    TARGETS = [
+        ('Payment Proof', 'Payment Proof'),
+        ('Product Image', 'Product Image'),
+    ]
+    TARGET_FIELDS = {
+        'Payment Proof': (Payment, 'proof'),
+        'Product Image': (Product, 'image'),
+    }
+
+    UPLOAD_STATUS = [
+        ('Open', 'Open'),
+        ('Complete', 'Complete'),
+    ]
+
+    id = models.UUIDField(default=uuid7, primary_key=True, unique=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="upload_sessions")
+    target = models.CharField(max_length=20, choices=TARGETS)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=UPLOAD_STATUS, default="Open")
+    name = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='upload_status_updated_idx'),
+        ]
+
+    def __str__(self):
+        return self.filename
+
+    @property
+    def temp_path(self):
+        return os.path.join(settings.UPLOAD_SESSION_ROOT, f'{self.pk}.part')
+
+    def target_field(self):
+        model, field_name = self.TARGET_FIELDS[self.target]
+        return model._meta.get_field(field_name)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+        return result
+
+    @classmethod
+    def purge(cls, before):
+        # Drop sessions nobody touched since `before` along with their chunks;
+        # completed files stay until gc_media finds them unreferenced
+        removed = 0
+        for session in cls.objects.filter(updated_at__lt=before).iterator():
+            session.delete()
+            removed += 1
+        return removed
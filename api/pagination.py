@@ -0,0 +1,85 @@
+import json
+
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination, newest first, ordered by (created_at, id) so every page is
+    an indexed range scan however deep the cursor is. Views can change the key
+    with a cursor_ordering attribute, e.g. users paginate on date_joined.
+
+    Unlike CursorPagination, the cursor holds every ordering column rather than
+    the first one plus an offset, so long runs of equal values (campaigns
+    sorted by a KPI most of them share) page without an offset, which DRF caps
+    at offset_cutoff.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        if any(hasattr(backend, 'get_ordering') for backend in getattr(view, 'filter_backends', [])):
+            return super().get_ordering(request, queryset, view)
+        return getattr(view, 'cursor_ordering', self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, position = self.cursor or (0, False, None)
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if position is not None:
+            queryset = queryset.filter(self.after(position, reverse))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = self._get_position_from_instance(results[-1], self.ordering) if len(results) > len(self.page) else None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None or offset > 0
+            self.has_previous = following is not None
+            self.next_position, self.previous_position = position, following
+        else:
+            self.has_next = following is not None
+            self.has_previous = position is not None or offset > 0
+            self.next_position, self.previous_position = following, position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def after(self, position, reverse):
+        # Rows past `position` in the page direction: (a, b) > (x, y) written as
+        # a >= x AND (a > x OR (a = x AND b > y)), each column in its own
+        # direction. The leading a >= x lets the index range scan start there.
+        try:
+            values = json.loads(position)
+        except ValueError:
+            values = [position]
+        if not isinstance(values, list):
+            values = [position]
+        query, equal, start = Q(), {}, None
+        for term, value in zip(self.ordering, values):
+            name = term.lstrip('-')
+            lookup = 'lt' if term.startswith('-') != reverse else 'gt'
+            if start is None:
+                start = Q(**{f'{name}__{lookup}e': value})
+            query |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return start & query
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for term in ordering:
+            name = term.lstrip('-')
+            values.append(str(instance[name] if isinstance(instance, dict) else getattr(instance, name)))
+        return json.dumps(values)
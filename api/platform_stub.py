@@ -0,0 +1,70 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from urllib.parse import parse_qs, urlsplit
+
+
+def stub_metrics(campaign_id, now=None):
+    # Deterministic totals that grow over time, like a live campaign's
+    digest = hashlib.blake2b(campaign_id.encode(), digest_size=8).digest()
+    daily_leads = digest[0] % 40
+    cost_per_lead = 1 + digest[1] % 20
+    days = ((now or time.time()) - 1_700_000_000) // 86400 % 365 + 1
+    leads = int(daily_leads * days)
+    return {'id': campaign_id, 'leads': leads, 'spend': f'{leads * cost_per_lead + digest[2] / 100:.2f}'}
+
+
+class StubPlatformServer:
+    """
+    Local stand-in for an ad platform API, used with StubPlatformAdapter:
+    GET /v1/insights?ids=<id>,<id> returns {"data": [{id, leads, spend}]}.
+    Each response waits `latency` seconds, and `error_rate` of them fail with
+    a 503 or a 429 carrying Retry-After, to exercise the retry path.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, latency=0.05, error_rate=0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                self.requests += 1
+                status, body, headers = await self.respond(request_line.decode('latin-1').split())
+                head = [f'HTTP/1.1 {status}', 'Content-Type: application/json', f'Content-Length: {len(body)}']
+                head += [f'{name}: {value}' for name, value in headers.items()]
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, request):
+        if len(request) != 3 or request[0] != 'GET':
+            return '405 Method Not Allowed', b'{}', {}
+        url = urlsplit(request[1])
+        if url.path != '/v1/insights':
+            return '404 Not Found', b'{}', {}
+        await asyncio.sleep(self.latency)
+        if random.random() < self.error_rate:
+            if random.random() < 0.5:
+                return '429 Too Many Requests', b'{"error": "rate limited"}', {'Retry-After': '1'}
+            return '503 Service Unavailable', b'{"error": "unavailable"}', {}
+        ids = [pk for pk in parse_qs(url.query).get('ids', [''])[0].split(',') if pk]
+        return '200 OK', json.dumps({'data': [stub_metrics(pk) for pk in ids]}).encode(), {}
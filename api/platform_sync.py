@@ -0,0 +1,272 @@
+import asyncio
+from decimal import Decimal, InvalidOperation
+import json
+import random
+import ssl
+from urllib.parse import urlencode, urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from api.models import Campaign
+
+
+class SyncError(Exception):
+    """A campaign could not be fetched; retryable errors are retried first."""
+
+    def __init__(self, message, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class HTTPClient:
+    """
+    Minimal asyncio HTTP/1.1 client for JSON APIs, keeping idle keep-alive
+    connections per host so concurrent fetches do not reconnect every time.
+    """
+
+    def __init__(self, timeout, max_idle=32):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = {}
+
+    async def get_json(self, url, params=None, headers=None):
+        parts = urlsplit(url)
+        target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        if params:
+            target += ('&' if parts.query else '?') + urlencode(params)
+        secure = parts.scheme == 'https'
+        key = (parts.hostname, parts.port or (443 if secure else 80), secure)
+        lines = [f'GET {target} HTTP/1.1', f'Host: {parts.netloc}', 'Accept: application/json', 'Connection: keep-alive']
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode()
+
+        idle = self._idle.setdefault(key, [])
+        reused = bool(idle)
+        reader, writer = idle.pop() if idle else await self._connect(key)
+        try:
+            writer.write(request)
+            status, response_headers, body = await asyncio.wait_for(self._read_response(reader), self.timeout)
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError, IndexError) as error:
+            # ValueError, IndexError and LimitOverrunError: a malformed status
+            # line, chunk size or header, or a line longer than the reader's limit
+            writer.close()
+            if reused and isinstance(error, (OSError, asyncio.IncompleteReadError)):
+                # The server closed the idle connection, try once on a new one
+                return await self.get_json(url, params, headers)
+            raise SyncError(f'{parts.netloc}: {error!r}', retryable=True)
+
+        if response_headers.get('connection', '').lower() == 'close' or len(idle) >= self.max_idle:
+            writer.close()
+        else:
+            idle.append((reader, writer))
+
+        if status == 429 or status >= 500:
+            retry_after = response_headers.get('retry-after')
+            raise SyncError(f'HTTP {status} from {parts.netloc}', retryable=True, retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if status != 200:
+            raise SyncError(f'HTTP {status} from {parts.netloc}: {body[:200].decode(errors="replace")}')
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise SyncError(f'Invalid JSON from {parts.netloc}')
+
+    async def _connect(self, key):
+        host, port, secure = key
+        try:
+            return await asyncio.wait_for(asyncio.open_connection(host, port, ssl=ssl.create_default_context() if secure else None), self.timeout)
+        except (OSError, asyncio.TimeoutError) as error:
+            raise SyncError(f'Cannot connect to {host}:{port}: {error!r}', retryable=True)
+
+    async def _read_response(self, reader):
+        status_line = await reader.readuntil(b'\r\n')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if not size:
+                    await reader.readuntil(b'\r\n')
+                    break
+                body += await reader.readexactly(size)
+                await reader.readexactly(2)
+            return status, headers, bytes(body)
+        if 'content-length' in headers:
+            return status, headers, await reader.readexactly(int(headers['content-length']))
+        if status in (204, 304) or 100 <= status < 200:
+            return status, headers, b''
+        # No length: the body ends when the server closes the connection
+        headers['connection'] = 'close'
+        return status, headers, await reader.read()
+
+    async def close(self):
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+
+class PlatformAdapter:
+    """
+    Fetches current totals for campaigns of one ad platform. Subclasses set
+    batch_size to the number of campaigns one API call can return, and
+    max_concurrency to stay under the platform's rate limits.
+    """
+    batch_size = 1
+    max_concurrency = 10
+
+    def __init__(self, client):
+        self.client = client
+
+    async def fetch(self, campaigns):
+        """Return {str(campaign id): {'leads': int, 'amount_spent': Decimal}} for (id, name) pairs."""
+        raise NotImplementedError
+
+
+class StubPlatformAdapter(PlatformAdapter):
+    """
+    Talks to the local platform served by `run_platform_stub`, so the whole
+    pipeline can be exercised and benchmarked offline.
+    """
+    batch_size = 50
+    max_concurrency = 50
+
+    async def fetch(self, campaigns):
+        data = await self.client.get_json(
+            f"{settings.PLATFORM_SYNC_STUB_URL.rstrip('/')}/v1/insights",
+            {'ids': ','.join(str(pk) for pk, _ in campaigns)},
+        )
+        metrics = {}
+        for row in data.get('data', ()):
+            try:
+                metrics[row['id']] = {'leads': int(row['leads']), 'amount_spent': Decimal(row['spend']).quantize(Decimal('0.01'))}
+            except (KeyError, TypeError, ValueError, InvalidOperation):
+                raise SyncError(f'Malformed insight row {row!r}')
+        return metrics
+
+
+def get_adapter_class(platform):
+    path = settings.PLATFORM_SYNC_ADAPTERS.get(platform)
+    return import_string(path) if path else None
+
+
+class SyncEngine:
+    """
+    Fetches campaign totals from their platforms concurrently and writes them
+    to Campaign in batches.
+
+    Campaigns are grouped per adapter and split into the adapter's API batch
+    size. At most `concurrency` calls are in flight overall, and at most the
+    adapter's max_concurrency per platform. Retryable failures (connection
+    errors, timeouts, 429 and 5xx) are retried with exponential backoff and
+    jitter, honouring Retry-After. Results go through a bounded queue to a
+    single writer, which applies `batch_size` campaigns per Campaign.set_totals
+    call in a worker thread while fetches continue.
+    """
+
+    def __init__(self, concurrency=None, retries=None, timeout=None, batch_size=None, backoff=None, dry_run=False):
+        self.concurrency = concurrency or settings.PLATFORM_SYNC_CONCURRENCY
+        self.retries = settings.PLATFORM_SYNC_RETRIES if retries is None else retries
+        self.timeout = timeout or settings.PLATFORM_SYNC_TIMEOUT
+        self.batch_size = batch_size or settings.PLATFORM_SYNC_BATCH_SIZE
+        self.backoff = settings.PLATFORM_SYNC_BACKOFF if backoff is None else backoff
+        self.dry_run = dry_run
+        self.fetched = self.updated = self.retried = 0
+        self.errors = {}
+
+    def run(self, campaigns_by_adapter):
+        """campaigns_by_adapter: {adapter class: [(campaign id, name), ...]}"""
+        asyncio.run(self._run(campaigns_by_adapter))
+        return self
+
+    async def _run(self, campaigns_by_adapter):
+        client = HTTPClient(self.timeout, max_idle=self.concurrency)
+        queue = asyncio.Queue(maxsize=self.batch_size * 2)
+        jobs = self._jobs(client, campaigns_by_adapter)
+        writer = asyncio.create_task(self._write(queue))
+        # `concurrency` workers share the job iterator, which bounds the calls
+        # in flight without a coroutine per campaign
+        workers = asyncio.gather(*(self._work(jobs, queue) for _ in range(self.concurrency)))
+        try:
+            # The writer only ends before the workers by raising, which would
+            # leave them waiting forever on the full queue
+            await asyncio.wait([workers, writer], return_when=asyncio.FIRST_COMPLETED)
+            if writer.done():
+                writer.result()
+            await workers
+            await queue.put(None)
+            await writer
+        finally:
+            workers.cancel()
+            writer.cancel()
+            await asyncio.gather(workers, writer, return_exceptions=True)
+            await client.close()
+
+    def _jobs(self, client, campaigns_by_adapter):
+        # Round-robin over the platforms so one slow or rate-limited platform
+        # does not hold every worker
+        pending = []
+        for adapter_class, campaigns in campaigns_by_adapter.items():
+            adapter = adapter_class(client)
+            limit = asyncio.Semaphore(adapter.max_concurrency)
+            pending.append((adapter, limit, iter([campaigns[start:start + adapter.batch_size] for start in range(0, len(campaigns), adapter.batch_size)])))
+        while pending:
+            for job in list(pending):
+                adapter, limit, batches = job
+                batch = next(batches, None)
+                if batch is None:
+                    pending.remove(job)
+                else:
+                    yield adapter, limit, batch
+
+    async def _work(self, jobs, queue):
+        for adapter, limit, campaigns in jobs:
+            await self._fetch(adapter, limit, campaigns, queue)
+
+    async def _fetch(self, adapter, limit, campaigns, queue):
+        for attempt in range(self.retries + 1):
+            async with limit:
+                try:
+                    metrics = await adapter.fetch(campaigns)
+                    break
+                except SyncError as error:
+                    if not error.retryable or attempt == self.retries:
+                        for pk, _ in campaigns:
+                            self.errors[pk] = str(error)
+                        return
+                    delay = error.retry_after or self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            # Sleep outside the platform limit so other calls can use the slot
+            self.retried += 1
+            await asyncio.sleep(delay)
+        for pk, _ in campaigns:
+            if str(pk) in metrics:
+                self.fetched += 1
+                await queue.put((pk, metrics[str(pk)]))
+            else:
+                self.errors[pk] = f'No data returned by {type(adapter).__name__}'
+
+    async def _write(self, queue):
+        set_totals = sync_to_async(Campaign.set_totals)
+        batch = {}
+        while True:
+            item = await queue.get()
+            if item is not None:
+                batch[item[0]] = item[1]
+            if batch and (item is None or len(batch) >= self.batch_size):
+                if not self.dry_run:
+                    self.updated += await set_totals(batch)
+                batch = {}
+            if item is None:
+                return
+
+    def summary(self):
+        return {'fetched': self.fetched, 'updated': self.updated, 'retried': self.retried, 'errors': len(self.errors)}
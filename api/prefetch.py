@@ -0,0 +1,133 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _path(prefix, name):
+    return f'{prefix}__{name}' if prefix else name
+
+
+class QueryPlan:
+    """
+    Walks a serializer's fields and records the select_related, prefetch_related
+    and only() arguments needed to render it without per-row queries.
+
+    Serializers can list extra relations read by SerializerMethodFields in
+    Meta.select_related, e.g. select_related = ('client__user',).
+    """
+
+    def __init__(self, serializer, model, annotations=()):
+        self.select_related = set()
+        self.prefetch_related = set()
+        # prefix -> (model, field names read, or None when every column is needed)
+        self.columns = {'': (model, set())}
+        self.annotations = set(annotations)
+        self._visit(serializer, model, '', False)
+        for path in getattr(getattr(serializer, 'Meta', None), 'select_related', ()):
+            prefix, current, prefetch = '', model, False
+            for name in path.split('__'):
+                model_field = current._meta.get_field(name)
+                prefix, prefetch = self._join(prefix, model_field, prefetch)
+                current = model_field.related_model
+            self._load_all(prefix, prefetch)
+
+    def only(self):
+        fields = []
+        for prefix, (model, names) in self.columns.items():
+            if names is None:
+                names = {field.name for field in model._meta.concrete_fields}
+            fields.extend(_path(prefix, name) for name in sorted(names | {model._meta.pk.name}))
+        return fields
+
+    def _visit(self, serializer, model, prefix, prefetch):
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if not field.source_attrs:
+                # SerializerMethodField or source='*': it may read any column
+                self._load_all(prefix, prefetch)
+                continue
+            self._read(field, model, prefix, field.source_attrs, prefetch)
+
+    def _read(self, field, model, prefix, attrs, prefetch):
+        name, rest = attrs[0], attrs[1:]
+        if not prefix and name in self.annotations:
+            return
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # A property or method on the model
+            self._load_all(prefix, prefetch)
+            return
+        if not model_field.is_relation:
+            self._load(prefix, model_field.name, prefetch)
+            return
+
+        if not rest and isinstance(field, serializers.ManyRelatedField):
+            self.prefetch_related.add(_path(prefix, name))
+            return
+        if not rest and isinstance(field, serializers.RelatedField) and field.use_pk_only_optimization() and model_field.concrete:
+            # Only the foreign key column is rendered
+            self._load(prefix, name, prefetch)
+            return
+
+        path, prefetch = self._join(prefix, model_field, prefetch)
+        related = model_field.related_model
+        if rest:
+            self._read(field, related, path, rest, prefetch)
+        elif isinstance(field, serializers.ListSerializer):
+            self._visit(field.child, related, path, prefetch)
+        elif isinstance(field, serializers.BaseSerializer):
+            self._visit(field, related, path, prefetch)
+        else:
+            self._load_all(path, prefetch)
+
+    def _join(self, prefix, model_field, prefetch):
+        path = _path(prefix, model_field.name)
+        if prefetch or model_field.many_to_many or model_field.one_to_many:
+            self.prefetch_related.add(path)
+            return path, True
+        self.select_related.add(path)
+        if model_field.concrete:
+            self._load(prefix, model_field.name, prefetch)
+        self.columns.setdefault(path, (model_field.related_model, set()))
+        return path, False
+
+    def _load(self, prefix, name, prefetch):
+        if prefetch:
+            return
+        names = self.columns[prefix][1]
+        if names is not None:
+            names.add(name)
+
+    def _load_all(self, prefix, prefetch):
+        if not prefetch:
+            self.columns[prefix] = (self.columns[prefix][0], None)
+
+
+_plans = {}
+
+
+def plan_queryset(queryset, serializer_class, defer=True):
+    key = (serializer_class, queryset.model, frozenset(queryset.query.annotations))
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = QueryPlan(serializer_class(), queryset.model, queryset.query.annotations)
+    if plan.select_related:
+        queryset = queryset.select_related(*sorted(plan.select_related))
+    if plan.prefetch_related:
+        queryset = queryset.prefetch_related(*sorted(plan.prefetch_related))
+    if defer:
+        queryset = queryset.only(*plan.only())
+    return queryset
+
+
+class SerializerPrefetchMixin:
+    """
+    Applies the serializer's QueryPlan to the view's queryset. Columns are only
+    deferred on safe methods so writes always work on fully loaded rows.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return plan_queryset(queryset, self.get_serializer_class(), defer=self.request.method in SAFE_METHODS)
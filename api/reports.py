@@ -0,0 +1,233 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from api.models import Campaign, CampaignDailyStat, Client, Payment, Product, User
+from api.table_versions import versions
+from api.views import IsAdminManagerUser
+
+
+def _sum(field, decimal=True):
+    output_field = models.DecimalField(max_digits=20, decimal_places=2) if decimal else models.BigIntegerField()
+    return Sum(field, output_field=output_field)
+
+
+class ReportSource:
+    """
+    What one report source may group by and aggregate. A dimension is one or
+    more output columns, e.g. media_buyer groups by the id and also returns
+    the email; its first column, when a plain column, is also a filter.
+    `tables` are the models whose changes invalidate cached results, including
+    the ones dimensions read through a join.
+    """
+
+    def __init__(self, model, date_field, dimensions, metrics, tables):
+        self.model = model
+        self.date_field = date_field
+        self.dimensions = {name: columns if isinstance(columns, dict) else {name: columns} for name, columns in dimensions.items()}
+        self.metrics = metrics
+        self.tables = tables
+
+
+def _campaign_dimensions(prefix=''):
+    return {
+        'platform': F(f'{prefix}platform'),
+        'status': F(f'{prefix}status'),
+        'country': F(f'{prefix}product__country'),
+        'product_type': F(f'{prefix}product__type'),
+        'media_buyer': {'media_buyer': F(f'{prefix}media_buyer'), 'media_buyer_email': F(f'{prefix}media_buyer__email')},
+        'client': {'client': F(f'{prefix}client'), 'client_email': F(f'{prefix}client__user__email')},
+    }
+
+
+REPORT_SOURCES = {
+    # Campaign totals; month is the month the campaign started
+    'campaigns': ReportSource(
+        Campaign, 'started_date',
+        dimensions={**_campaign_dimensions(), 'month': TruncMonth('started_date')},
+        metrics={'spend': _sum('amount_spent'), 'leads': _sum('leads', decimal=False), 'count': Count('id')},
+        tables=(Campaign, Product, Client, User),
+    ),
+    # Daily stats, for spend and leads by the month they happened in
+    'campaign_stats': ReportSource(
+        CampaignDailyStat, 'date',
+        dimensions={**_campaign_dimensions('campaign__'), 'month': TruncMonth('date')},
+        metrics={'spend': _sum('amount_spent'), 'leads': _sum('leads', decimal=False), 'count': Count('id')},
+        tables=(CampaignDailyStat, Campaign, Product, Client, User),
+    ),
+    'products': ReportSource(
+        Product, 'created_at',
+        dimensions={
+            'status': F('status'),
+            'country': F('country'),
+            'product_type': F('type'),
+            'media_buyer': {'media_buyer': F('media_buyer'), 'media_buyer_email': F('media_buyer__email')},
+            'client': {'client': F('client'), 'client_email': F('client__user__email')},
+            'month': TruncMonth('created_at'),
+        },
+        metrics={'count': Count('id')},
+        tables=(Product, Client, User),
+    ),
+    'payments': ReportSource(
+        Payment, 'created_at',
+        dimensions={
+            'type': F('type'),
+            'status': F('status'),
+            'client': {'client': F('client'), 'client_email': F('client__user__email')},
+            'month': TruncMonth('created_at'),
+        },
+        metrics={'amount': _sum('amount'), 'count': Count('id')},
+        tables=(Payment, Client, User),
+    ),
+}
+
+
+def _names(value):
+    return list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+
+
+def _parse_date(param, value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise serializers.ValidationError({param: ['Expected a date, YYYY-MM-DD.']})
+
+
+class ReportQuery:
+    """
+    A validated report request, compiled to one GROUP BY query. `key` is the
+    same for requests that differ only in parameter or metric order.
+    """
+
+    def __init__(self, params):
+        source = params.get('source')
+        if source not in REPORT_SOURCES:
+            raise serializers.ValidationError({'source': [f"Expected one of {', '.join(REPORT_SOURCES)}."]})
+        self.source = REPORT_SOURCES[source]
+        self.name = source
+
+        self.dimensions = _names(params.get('dimensions', ''))
+        unknown = [name for name in self.dimensions if name not in self.source.dimensions]
+        if unknown:
+            raise serializers.ValidationError({'dimensions': [f"Unknown dimension(s) {', '.join(unknown)}, expected {', '.join(self.source.dimensions)}."]})
+        self.metrics = sorted(_names(params.get('metrics', '')) or self.source.metrics)
+        unknown = [name for name in self.metrics if name not in self.source.metrics]
+        if unknown:
+            raise serializers.ValidationError({'metrics': [f"Unknown metric(s) {', '.join(unknown)}, expected {', '.join(self.source.metrics)}."]})
+
+        # ?status=Approved style filters, on dimensions backed by a column
+        self.filters = {
+            name: params[name]
+            for name, columns in self.source.dimensions.items()
+            if name in params and isinstance(columns[name], F)
+        }
+        self.start = _parse_date('start', params['start']) if params.get('start') else None
+        self.end = _parse_date('end', params['end']) if params.get('end') else None
+
+    @property
+    def key(self):
+        normalized = json.dumps({
+            'source': self.name,
+            'dimensions': self.dimensions,
+            'metrics': self.metrics,
+            'filters': self.filters,
+            'start': self.start and self.start.isoformat(),
+            'end': self.end and self.end.isoformat(),
+        }, sort_keys=True)
+        table_versions = ':'.join(versions(self.source.tables))
+        return f'report:{hashlib.sha256(normalized.encode()).hexdigest()}:{hashlib.sha256(table_versions.encode()).hexdigest()[:16]}'
+
+    def queryset(self):
+        columns = {}
+        for name in self.dimensions:
+            columns.update(self.source.dimensions[name])
+        queryset = self.source.model.objects.all()
+        for name, value in self.filters.items():
+            try:
+                queryset = queryset.filter(**{self.source.dimensions[name][name].name: value})
+            except (ValueError, ValidationError):
+                raise serializers.ValidationError({name: [f'Invalid value "{value}".']})
+        queryset = self.filter_dates(queryset)
+        if not columns:
+            return queryset
+        # Model fields are selected by name, values() rejects aliases shadowing them
+        fields = [name for name, expression in columns.items() if isinstance(expression, F) and expression.name == name]
+        expressions = {name: expression for name, expression in columns.items() if name not in fields}
+        queryset = queryset.values(*fields, **expressions).annotate(**{name: self.source.metrics[name] for name in self.metrics})
+        return queryset.order_by(*columns)
+
+    def filter_dates(self, queryset):
+        field = self.source.model._meta.get_field(self.source.date_field)
+        start, end = self.start, self.end and self.end + timedelta(days=1)
+        if isinstance(field, models.DateTimeField):
+            start = start and timezone.make_aware(datetime.combine(start, time.min))
+            end = end and timezone.make_aware(datetime.combine(end, time.min))
+        if start:
+            queryset = queryset.filter(**{f'{field.name}__gte': start})
+        if end:
+            queryset = queryset.filter(**{f'{field.name}__lt': end})
+        return queryset
+
+    def run(self):
+        limit = settings.REPORT_MAX_ROWS
+        if self.dimensions:
+            rows = list(self.queryset()[:limit + 1])
+        else:
+            # Grand totals
+            rows = [self.queryset().aggregate(**{name: self.source.metrics[name] for name in self.metrics})]
+        for row in rows:
+            for name, value in row.items():
+                if isinstance(value, Decimal):
+                    row[name] = f'{value:.2f}'
+                elif isinstance(value, (date, datetime)):
+                    # Month buckets
+                    row[name] = value.strftime('%Y-%m')
+                elif value is not None and not isinstance(value, (int, str)):
+                    row[name] = str(value)
+        return {'rows': rows[:limit], 'truncated': len(rows) > limit}
+
+
+class ReportView(APIView):
+    """
+    GET /api/reports?source=payments&dimensions=type,client&metrics=amount&status=Approved
+
+    Groups one source (campaigns, campaign_stats, products, payments) by
+    whitelisted dimensions and aggregates whitelisted metrics in a single
+    query. Dimension parameters filter on a value and start/end on the
+    source's date. Results are cached until one of the source's tables
+    changes, or REPORT_CACHE_TTL passes.
+
+    Reports are computed on the primary, not the replica: the table versions
+    move when the primary commits, and a replica still behind it would have
+    its stale rows cached under the new versions.
+    """
+    permission_classes = (IsAuthenticated, IsAdminManagerUser)
+
+    def get(self, request):
+        query = ReportQuery(request.query_params)
+        key = query.key
+        result = cache.get(key)
+        cached = result is not None
+        if not cached:
+            result = query.run()
+            cache.set(key, result, settings.REPORT_CACHE_TTL)
+        return Response({
+            'source': query.name,
+            'dimensions': query.dimensions,
+            'metrics': query.metrics,
+            'cached': cached,
+            **result,
+        })
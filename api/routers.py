@@ -0,0 +1,63 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA = 'replica'
+
+_state = threading.local()
+
+
+def _pin_key(user):
+    return f'replica-pin:{user.pk}'
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica alias while a ReplicaReadMixin view serves a safe
+    request. Everything else, and any read after a write in the same request,
+    goes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if getattr(_state, 'use_replica', False) and REPLICA in settings.DATABASES:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        _state.use_replica = False
+        _state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+class ReplicaReadMixin:
+    """
+    Serves GET/HEAD/OPTIONS from the replica once the user is authenticated.
+    After a write the user is pinned to the primary for REPLICA_PIN_SECONDS so
+    they read their own changes while the replica catches up.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user = request.user
+        pinned = user.is_authenticated and cache.get(_pin_key(user))
+        _state.use_replica = request.method in SAFE_METHODS and not pinned
+
+    def dispatch(self, request, *args, **kwargs):
+        _state.use_replica = False
+        _state.wrote = False
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            user = getattr(request, 'user', None)
+            if _state.wrote and user is not None and user.is_authenticated:
+                cache.set(_pin_key(user), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+            _state.use_replica = False
+            _state.wrote = False
@@ -0,0 +1,104 @@
+from django.db.models import Q
+
+from api.models import Campaign, CampaignDailyStat, Creative, Page, Payment, Product, VoiceOver
+
+
+class Scope:
+    """
+    Rows of a model one role may see, as a Q object for the requesting user.
+    None means nothing.
+    """
+
+    def q(self, user):
+        raise NotImplementedError
+
+
+class Everything(Scope):
+    def q(self, user):
+        return Q()
+
+
+class Own(Scope):
+    # Rows whose `field` is the user: "media buyer sees own", "creator sees assigned"
+    def __init__(self, field):
+        self.field = field
+
+    def q(self, user):
+        return Q(**{self.field: user.pk})
+
+
+class OwnClient(Scope):
+    # Rows of the client account the user belongs to
+    def __init__(self, field='client'):
+        self.field = field
+
+    def q(self, user):
+        client = getattr(user, 'client', None)
+        return Q(**{self.field: client.pk}) if client else None
+
+
+EVERYTHING = Everything()
+
+# Model -> role -> scope. Roles left out see nothing. Each filter has a
+# (<field>, created_at, id) index on its model, or on the joined model.
+ROLE_SCOPES = {
+    Payment: {
+        'Admin': EVERYTHING,
+        'Manager': EVERYTHING,
+        'Client': OwnClient(),
+    },
+    Product: {
+        'Admin': EVERYTHING,
+        'Manager': EVERYTHING,
+        'Client': OwnClient(),
+        'Media Buyer': Own('media_buyer'),
+    },
+    Campaign: {
+        'Admin': EVERYTHING,
+        'Manager': EVERYTHING,
+        'Client': OwnClient(),
+        'Media Buyer': Own('media_buyer'),
+    },
+    CampaignDailyStat: {
+        'Admin': EVERYTHING,
+        'Manager': EVERYTHING,
+        'Client': OwnClient('campaign__client'),
+        'Media Buyer': Own('campaign__media_buyer'),
+    },
+    Page: {
+        'Admin': EVERYTHING,
+        'Manager': EVERYTHING,
+        'Media Buyer': Own('media_buyer'),
+        'Page Builder': Own('creator'),
+    },
+    VoiceOver: {
+        'Admin': EVERYTHING,
+        'Manager': EVERYTHING,
+        'Media Buyer': Own('media_buyer'),
+        'Voice Over': Own('creator'),
+    },
+    Creative: {
+        'Admin': EVERYTHING,
+        'Manager': EVERYTHING,
+        'Media Buyer': Own('media_buyer'),
+        'Video Editor': Own('creator'),
+    },
+}
+
+
+def scope_queryset(queryset, user):
+    scope = ROLE_SCOPES[queryset.model].get(getattr(user, 'role', None))
+    q = scope.q(user) if scope else None
+    if q is None:
+        return queryset.none()
+    return queryset.filter(q)
+
+
+class RoleScopedMixin:
+    """
+    Limits the view's queryset to the rows ROLE_SCOPES gives the user's role,
+    for lists and for detail lookups alike.
+    """
+
+    def get_queryset(self):
+        return scope_queryset(super().get_queryset(), self.request.user)
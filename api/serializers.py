@@ -1,9 +1,7 @@
-from datetime import date
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
 from rest_framework import serializers
-from django.db.models import Sum
 from api.models import *
-from django.core.files import File
-from django.conf import settings
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(allow_blank=True, write_only=True)
@@ -19,11 +17,8 @@ class UserSerializer(serializers.ModelSerializer):
         user = User(**validated_data)
         user.set_password(password)  # Hash the password
         role = validated_data.get('role')
-        if role:
-            profile = os.path.join(settings.BASE_DIR, f'media/user_profiles/{role.lower().replace(" ", "_")}.png')
-            print(profile)
-            with open(profile, 'rb') as photo_file:
-                user.profile.save(f'{user.email}_{role.lower().replace(" ", "_")}.png', File(photo_file), save=False)
+        if role and not validated_data.get('profile'):
+            user.profile = role_profile(role)
         user.save()
         return user
 
@@ -37,19 +32,17 @@ class UserSerializer(serializers.ModelSerializer):
         if 'role' in validated_data:
             role = validated_data['role']
             if instance.role != role:
-                profile = os.path.join(settings.BASE_DIR, f'media/user_profiles/{role.lower().replace(" ", "_")}.png')
-                print(profile)
-                with open(profile, 'rb') as photo_file:
-                    instance.profile.save(f'{instance.email}_{role.lower().replace(" ", "_")}.png', File(photo_file), save=False)
+                instance.profile = role_profile(role)
 
         # Update other fields using the base class's update method
         return super(UserSerializer, self).update(instance, validated_data)
 
 
 class ClientSerializer(serializers.ModelSerializer):
-    ads_balance = serializers.SerializerMethodField()
-    leads_balance = serializers.SerializerMethodField()
-    membership = serializers.SerializerMethodField()
+    # Read from the annotations added by Client.objects.with_balances()
+    ads_balance = serializers.ReadOnlyField()
+    leads_balance = serializers.ReadOnlyField()
+    membership = serializers.ReadOnlyField()
     user = UserSerializer(required=True)
 
     class Meta:
@@ -88,55 +81,54 @@ class ClientSerializer(serializers.ModelSerializer):
         # Update the Client instance
         return super(ClientSerializer, self).update(instance, validated_data)
 
-    def get_ads_balance(self, client):
-        # Calculate total payments with type 'Ads Balance'
-        total_ads_payments = Payment.objects.filter(
-            client=client,
-            status="Approved",
-            type='Ads Balance'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        # Calculate total spent in all campaigns
-        total_campaign_spent = Campaign.objects.filter(
-            client=client,
-        ).aggregate(total=Sum('amount_spent'))['total'] or 0
-
-        return total_ads_payments - total_campaign_spent
-
-    def get_leads_balance(self, client):
-        # Calculate total payments with type 'Leads Balance'
-        total_leads_payments = Payment.objects.filter(
-            client=client,
-            status="Approved",
-            type='Leads Balance'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        total_wrong_leads = Payment.objects.filter(
-            client=client,
-            status="Approved",
-            type='Wrong Orders'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        # Calculate total leads in all campaigns
-        total_campaign_leads = Campaign.objects.filter(
-            client=client,
-        ).aggregate(total=Sum('leads'))['total'] or 0
-
-        return total_leads_payments + total_wrong_leads - total_campaign_leads * client.commission
-
-    def get_membership(self, client):
-        # Check if there is a payment with type 'Membership' for the current month
-        current_month_membership_payment = Payment.objects.filter(
-            client=client,
-            status="Approved",
-            type='Membership',
-            created_at__year=date.today().year,
-            created_at__month=date.today().month
-        ).exists()
-
-        return current_month_membership_payment
+class UploadField(serializers.UUIDField):
+    # Takes the id of a completed UploadSession instead of the file itself and
+    # resolves to the name the upload was stored under
+    def __init__(self, target, **kwargs):
+        self.target = target
+        kwargs.setdefault('write_only', True)
+        kwargs.setdefault('required', False)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        pk = super().to_internal_value(data)
+        name = UploadSession.objects.filter(
+            pk=pk, user=self.context['request'].user, target=self.target, status='Complete'
+        ).values_list('name', flat=True).first()
+        if name is None:
+            raise serializers.ValidationError('No completed upload with this id.')
+        return name
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'target', 'filename', 'size', 'sha256', 'received', 'status', 'name', 'created_at')
+        read_only_fields = ('received', 'status', 'name')
+
+    def validate_size(self, value):
+        if value > settings.UPLOAD_SESSION_MAX_SIZE:
+            raise serializers.ValidationError(f'Uploads are limited to {settings.UPLOAD_SESSION_MAX_SIZE} bytes.')
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if len(value) != 64 or any(c not in '0123456789abcdef' for c in value):
+            raise serializers.ValidationError('Expected the hex SHA-256 of the whole file.')
+        return value
+
+    def validate(self, attrs):
+        # The name the file is stored under at complete, checked before any
+        # byte is uploaded
+        field = UploadSession(target=attrs['target']).target_field()
+        try:
+            field.generate_filename(None, attrs['filename'])
+        except SuspiciousFileOperation:
+            raise serializers.ValidationError({'filename': 'Not a valid file name.'})
+        return attrs
 
 class PaymentSerializer(serializers.ModelSerializer):
+    proof_upload = UploadField('Payment Proof', source='proof')
+
     class Meta:
         model = Payment
         fields = '__all__'
@@ -145,9 +137,12 @@ class PaymentSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     media_buyer = UserSerializer(read_only=True)
     client_name = serializers.SerializerMethodField(read_only=True)
+    image_variants = serializers.SerializerMethodField(read_only=True)
+    image_upload = UploadField('Product Image', source='image')
     class Meta:
         model = Product
         fields = '__all__'
+        select_related = ('client__user',)
 
     def get_client_name(self, obj):
         client = obj.client
@@ -155,11 +150,39 @@ class ProductSerializer(serializers.ModelSerializer):
             return f"{client.user.first_name} {client.user.last_name}"
         return None
 
+    def get_image_variants(self, obj):
+        # URLs of the resized copies, empty until the background resize is done
+        storage = obj.image.storage
+        request = self.context.get('request')
+        urls = {}
+        for name, path in obj.image_variants.items():
+            url = storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
+
 class CampaignSerializer(serializers.ModelSerializer):
+    # Annotated by Campaign.objects.with_kpis(). The ratios are SQL floats with
+    # no upper bound, a DecimalField would fail to format the large ones
+    cpl = serializers.FloatField(read_only=True)
+    budget_utilization = serializers.FloatField(read_only=True)
+    days_running = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Campaign
         fields = '__all__'
 
+class CampaignDailyStatSerializer(serializers.ModelSerializer):
+    # A bare id: thousands of rows are checked against the campaigns in one query
+    campaign = serializers.UUIDField(source='campaign_id')
+
+    class Meta:
+        model = CampaignDailyStat
+        fields = ('id', 'campaign', 'date', 'leads', 'amount_spent', 'updated_at')
+        read_only_fields = ('id', 'updated_at')
+        extra_kwargs = {'leads': {'min_value': 0}, 'amount_spent': {'min_value': 0}}
+        # Rows for an existing (campaign, date) overwrite it
+        validators = []
+
 class PageSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     class Meta:
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.authentication import invalidate_user
+from api.models import Campaign, CampaignDailyStat, Client, Payment, Product, User
+from api.table_versions import touch as touch_tables
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    # Run on the raw sqlite3 connection so the pragmas stay out of query counts
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def invalidate_cached_client_user(sender, instance, **kwargs):
+    if instance.user_id:
+        invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Campaign)
+@receiver(post_delete, sender=Campaign)
+@receiver(post_save, sender=CampaignDailyStat)
+@receiver(post_delete, sender=CampaignDailyStat)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def touch_report_tables(sender, instance, **kwargs):
+    # Cached /api/reports results are keyed by these versions
+    touch_tables(sender)
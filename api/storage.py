@@ -0,0 +1,53 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under the SHA-256 of its content, keeping the upload_to
+    directory as a prefix (user_profiles/ab/ab12...ef.png). The upload is hashed
+    while it streams to a temporary file, so identical uploads end up sharing
+    one file and an upload that is already stored costs no write.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save, never add a suffix
+        return name
+
+    def _save(self, name, content):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.location, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.location, prefix='.upload-')
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            digest = digest.hexdigest()
+            name = os.path.join(directory, digest[:2], digest + extension).replace('\\', '/')
+            path = self.path(name)
+            try:
+                # Refreshing the mtime keeps gc_media from collecting a file
+                # that just gained a new reference
+                os.utime(path)
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                os.replace(temp_path, path)
+            else:
+                os.remove(temp_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+content_addressed_storage = ContentAddressedStorage()
@@ -0,0 +1,30 @@
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _key(model):
+    return f'table-version:{model._meta.label_lower}'
+
+
+def touch(*models):
+    """
+    Give the models' tables a new version once the current transaction
+    commits, so anything cached under the old versions stops being read.
+    Called from post_save/post_delete, and by bulk writes that skip them.
+    """
+    def bump():
+        cache.set_many({_key(model): uuid.uuid4().hex for model in models}, timeout=None)
+    transaction.on_commit(bump)
+
+
+def versions(models):
+    # Current version of each table, started on first use
+    keys = [_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
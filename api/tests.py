@@ -1,3 +1,994 @@
-from django.test import TestCase
+import asyncio
+from datetime import date
+import hashlib
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import warnings
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from api.explain import assert_no_full_scan
+from api.management.commands.check_query_plans import Command as CheckQueryPlans
+from api.management.commands.gc_media import BATCH_SIZE as GC_BATCH_SIZE, ReferenceIndex
+from api.authentication import user_cache
+from api.blacklist import BloomFilter, RevocableRefreshToken, token_blacklist
+from api.images import render_variants
+from api.imports import CampaignReportImport
+from api.models import LEDGER_FIELDS, Campaign, CampaignDailyStat, Client, ClientLedger, Creative, Page, Payment, Product, ThrottleBucket, UploadSession, User, VoiceOver, role_profile
+from api.prefetch import QueryPlan
+from api.platform_sync import HTTPClient, PlatformAdapter, SyncEngine, SyncError
+from api.throttling import LoginIPThrottle, TokenBucketThrottle
+from api.routers import REPLICA
+from api.serializers import ProductSerializer
+from api.views import CustomTokenObtainPairSerializer
+
+
+class ClientBalanceQueryTests(TestCase):
+    """
+    /api/clients and /api/client/<pk> read the balances and membership from
+    annotations, so the number of queries does not grow with the clients.
+    """
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create(email='admin@example.com', role='Admin'))
+        users = User.objects.bulk_create([User(email=f'client{i}@example.com', role='Client') for i in range(10)])
+        self.clients = Client.objects.bulk_create([Client(user=user, commission=Decimal('1.50')) for user in users])
+        # Through save() so the ledgers are kept
+        for client in self.clients:
+            Payment.objects.create(client=client, amount=Decimal('100'), type='Ads Balance', status='Approved')
+            Payment.objects.create(client=client, amount=Decimal('50'), type='Membership', status='Approved')
+            Campaign.objects.create(client=client, leads=4, amount_spent=Decimal('30'))
+
+    def add_clients(self, count):
+        users = User.objects.bulk_create([User(email=f'more{i}@example.com', role='Client') for i in range(count)], batch_size=1000)
+        Client.objects.bulk_create([Client(user=user) for user in users], batch_size=1000)
+
+    def get(self, url):
+        response = self.api.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_list(self):
+        with CaptureQueriesContext(connection) as queries:
+            results = self.get('/api/clients')['results']
+        self.assertEqual(len(results), 10)
+        row = next(row for row in results if row['id'] == str(self.clients[0].pk))
+        self.assertEqual(Decimal(str(row['ads_balance'])), Decimal('70'))
+        self.assertEqual(Decimal(str(row['leads_balance'])), Decimal('-6'))
+        self.assertIs(row['membership'], True)
+
+        self.add_clients(10_000)
+        with self.assertNumQueries(len(queries)):
+            results = self.get('/api/clients')['results']
+        self.assertEqual(len(results), 50)
+
+    def test_detail(self):
+        url = f'/api/client/{self.clients[0].pk}'
+        with CaptureQueriesContext(connection) as queries:
+            self.get(url)
+        self.add_clients(10_000)
+        with self.assertNumQueries(len(queries)):
+            row = self.get(url)
+        self.assertEqual(Decimal(str(row['ads_balance'])), Decimal('70'))
+        self.assertIs(row['membership'], True)
+
+
+
+class ClientLedgerTests(TestCase):
+    """
+    Payment and Campaign saves and deletes move ClientLedger by their
+    difference; reconcile_ledgers repairs what bypassed them.
+    """
+
+    def setUp(self):
+        users = User.objects.bulk_create([User(email=f'client{i}@example.com', role='Client') for i in range(2)])
+        self.client_a, self.client_b = Client.objects.bulk_create([Client(user=user) for user in users])
+
+    def ledger(self, client):
+        return ClientLedger.objects.filter(client=client).values(*LEDGER_FIELDS).first()
+
+    def assertLedger(self, client, **expected):
+        self.assertEqual(self.ledger(client), {field: expected.get(field, 0) for field in LEDGER_FIELDS})
+
+    def test_payment_deltas(self):
+        payment = Payment.objects.create(client=self.client_a, amount=Decimal('100'), type='Ads Balance', status='Approved')
+        self.assertLedger(self.client_a, ads_paid=Decimal('100'))
+        payment.amount = Decimal('120')
+        payment.save()
+        self.assertLedger(self.client_a, ads_paid=Decimal('120'))
+        payment.status = 'Pending'
+        payment.save()
+        self.assertLedger(self.client_a)
+        payment.status, payment.type = 'Approved', 'Leads Balance'
+        payment.save()
+        self.assertLedger(self.client_a, leads_paid=Decimal('120'))
+        payment.client = self.client_b
+        payment.save()
+        self.assertLedger(self.client_a)
+        self.assertLedger(self.client_b, leads_paid=Decimal('120'))
+        payment.delete()
+        self.assertLedger(self.client_b)
+
+    def test_campaign_deltas(self):
+        Payment.objects.create(client=self.client_a, amount=Decimal('50'), type='Ads Balance', status='Approved')
+        campaign = Campaign.objects.create(client=self.client_a, leads=4, amount_spent=Decimal('30'))
+        self.assertLedger(self.client_a, ads_paid=Decimal('50'), amount_spent=Decimal('30'), leads=4)
+        campaign.leads, campaign.amount_spent = 6, Decimal('45.50')
+        campaign.save()
+        self.assertLedger(self.client_a, ads_paid=Decimal('50'), amount_spent=Decimal('45.50'), leads=6)
+        campaign.delete()
+        self.assertLedger(self.client_a, ads_paid=Decimal('50'))
+
+    def test_reconcile_repairs_drift(self):
+        Payment.objects.create(client=self.client_a, amount=Decimal('100'), type='Ads Balance', status='Approved')
+        Campaign.objects.create(client=self.client_a, leads=4, amount_spent=Decimal('30'))
+        # Neither goes through save(), so the ledgers are left behind
+        Payment.objects.update(amount=Decimal('80'))
+        Campaign.objects.create(client=self.client_b, leads=2, amount_spent=Decimal('10'))
+        ClientLedger.objects.filter(client=self.client_b).delete()
+
+        out = io.StringIO()
+        call_command('reconcile_ledgers', dry_run=True, stdout=out)
+        self.assertIn('found drift on 2', out.getvalue())
+        self.assertLedger(self.client_a, ads_paid=Decimal('100'), amount_spent=Decimal('30'), leads=4)
+        self.assertIsNone(self.ledger(self.client_b))
+
+        call_command('reconcile_ledgers', chunk_size=1, stdout=out)
+        self.assertLedger(self.client_a, ads_paid=Decimal('80'), amount_spent=Decimal('30'), leads=4)
+        self.assertLedger(self.client_b, amount_spent=Decimal('10'), leads=2)
+        out = io.StringIO()
+        call_command('reconcile_ledgers', stdout=out)
+        self.assertIn('fixed drift on 0', out.getvalue())
+
+
+class QueryPlanTests(TestCase):
+    # EXPLAIN every list/detail view queryset, for every role and ordering
+    def test_view_querysets_use_indexes(self):
+        checked = 0
+        for name, queryset in CheckQueryPlans().view_querysets():
+            with self.subTest(name):
+                assert_no_full_scan(queryset)
+            checked += 1
+        self.assertGreater(checked, 0)
+
+
+
+class PrefetchPlanTests(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create(email='admin@example.com', role='Admin'))
+
+    def add_products(self, count, start=0):
+        users = User.objects.bulk_create(
+            [User(email=f'client{number}@example.com', role='Client') for number in range(start, start + count)]
+            + [User(email=f'buyer{number}@example.com', role='Media Buyer') for number in range(start, start + count)]
+        )
+        clients = Client.objects.bulk_create([Client(user=user) for user in users[:count]])
+        Product.objects.bulk_create([
+            Product(name=f'Product {number}', client=client, media_buyer=buyer)
+            for number, (client, buyer) in enumerate(zip(clients, users[count:]), start)
+        ])
+        Payment.objects.bulk_create([Payment(client=client, amount=Decimal('10'), type='Ads Balance') for client in clients])
+
+    def test_plan_of_the_product_serializer(self):
+        plan = QueryPlan(ProductSerializer(), Product)
+        self.assertLessEqual({'media_buyer', 'client__user'}, plan.select_related)
+        self.assertEqual(plan.prefetch_related, set())
+        # The nested user is rendered by UserSerializer, which never reads the password
+        self.assertIn('media_buyer__email', plan.only())
+        self.assertNotIn('media_buyer__password', plan.only())
+
+    def test_list_queries_do_not_grow_with_the_rows(self):
+        self.add_products(2)
+        for url, model in (('/api/products', Product), ('/api/payments', Payment)):
+            with self.subTest(url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(len(self.api.get(url).json()['results']), model.objects.count())
+                self.add_products(10, start=Product.objects.count())
+                with self.assertNumQueries(len(queries)):
+                    self.assertEqual(len(self.api.get(url).json()['results']), model.objects.count())
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create(email='admin@example.com', role='Admin'))
+        Product.objects.bulk_create([Product(name=f'Product {number}') for number in range(7)])
+        # Ties on created_at are broken by id
+        Product.objects.filter(name__in=['Product 2', 'Product 3', 'Product 4', 'Product 5']).update(created_at=Product.objects.get(name='Product 2').created_at)
+        self.expected = list(Product.objects.order_by('-created_at', '-id').values_list('name', flat=True))
+
+    def pages(self, url, link):
+        pages = []
+        while url:
+            response = self.api.get(url).json()
+            pages.append([row['name'] for row in response['results']])
+            url = response[link]
+        return pages
+
+    def test_walks_every_row_once_in_both_directions(self):
+        forward = self.pages('/api/products?page_size=2', 'next')
+        self.assertEqual([len(page) for page in forward], [2, 2, 2, 1])
+        self.assertEqual(sum(forward, []), self.expected)
+
+        last = self.api.get('/api/products?page_size=2').json()
+        while last['next']:
+            last = self.api.get(last['next']).json()
+        backward = self.pages(last['previous'], 'previous')
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_new_rows_do_not_shift_the_next_page(self):
+        first = self.api.get('/api/products?page_size=3').json()
+        Product.objects.create(name='Newest')
+        second = self.api.get(first['next']).json()
+        self.assertEqual([row['name'] for row in second['results']], self.expected[3:6])
+
+
+class QueryTimingTests(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create(email='admin@example.com', role='Admin'))
+
+    def test_headers_report_the_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get('/api/products')
+        count = len(queries)
+        self.assertGreater(count, 0)
+        self.assertEqual(response['X-Query-Count'], str(count))
+        self.assertRegex(response['Server-Timing'], rf'^db;dur=\d+\.\d;desc="{count} queries", app;dur=\d+\.\d$')
+        self.assertNotIn('Server-Timing', self.api.get('/admin/login/'))
+
+    @override_settings(QUERY_BUDGET_COUNT=0)
+    def test_request_over_budget_is_logged(self):
+        with self.assertLogs('api.middleware', 'WARNING') as logs:
+            self.api.get('/api/products')
+        self.assertIn('GET /api/products (product-list)', logs.output[0])
+
+
+
+class SharedMediaTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        media = override_settings(MEDIA_ROOT=self.root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def files(self):
+        return sorted(os.path.relpath(os.path.join(path, name), self.root) for path, _, names in os.walk(self.root) for name in names)
+
+    def test_new_users_write_no_files(self):
+        User.objects.create_user('buyer@example.com', 'secret', role='Media Buyer')
+        api = APIClient()
+        api.force_authenticate(User.objects.create(email='admin@example.com', role='Admin'))
+        response = api.post('/api/users', {'email': 'editor@example.com', 'password': 'secret', 'role': 'Video Editor'}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.files(), [])
+        self.assertEqual(User.objects.get(email='buyer@example.com').profile.name, role_profile('Media Buyer'))
+        self.assertEqual(User.objects.get(email='editor@example.com').profile.name, role_profile('Video Editor'))
+
+    def test_identical_uploads_share_one_file(self):
+        storage = User._meta.get_field('profile').storage
+        names = {storage.save(f'user_profiles/{name}', ContentFile(b'same avatar')) for name in ('a.png', 'b.png')}
+        self.assertEqual(len(names), 1)
+        self.assertEqual(self.files(), [names.pop()])
+
+
+class CampaignKPITests(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create(email='admin@example.com', role='Admin'))
+
+    def test_large_ratios(self):
+        campaign = Campaign.objects.create(budget=Decimal('1.00'), amount_spent=Decimal('1500000'), leads=1)
+        response = self.api.get(f'/api/campaign/{campaign.pk}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['budget_utilization'], 1_500_000)
+        self.assertEqual(response.json()['cpl'], 1_500_000)
+
+    def test_ratios_without_a_denominator(self):
+        campaign = Campaign.objects.create(amount_spent=Decimal('10'))
+        response = self.api.get(f'/api/campaign/{campaign.pk}')
+        self.assertIsNone(response.json()['budget_utilization'])
+        self.assertIsNone(response.json()['cpl'])
+
+
+class CampaignDailyStatTests(TestCase):
+    def setUp(self):
+        self.client_account = Client.objects.create(user=User.objects.create(email='client@example.com', role='Client'))
+        # Entered by hand before any stats
+        self.campaign = Campaign.objects.create(client=self.client_account, leads=2, amount_spent=Decimal('5.00'))
+
+    def stat(self, day, leads, amount_spent):
+        return {'campaign_id': self.campaign.pk, 'date': date(2024, 1, day), 'leads': leads, 'amount_spent': Decimal(amount_spent)}
+
+    def assertTotals(self, leads, amount_spent):
+        self.campaign.refresh_from_db()
+        ledger = ClientLedger.objects.get(client=self.client_account)
+        self.assertEqual((self.campaign.leads, self.campaign.amount_spent), (leads, Decimal(amount_spent)))
+        self.assertEqual((ledger.leads, ledger.amount_spent), (leads, Decimal(amount_spent)))
+
+    def test_upsert_adds_new_days(self):
+        self.assertEqual(CampaignDailyStat.upsert([self.stat(1, 3, '10.00'), self.stat(2, 4, '20.00')]), (2, 0))
+        self.assertTotals(9, '35.00')
+
+    def test_upsert_moves_totals_by_the_difference(self):
+        CampaignDailyStat.upsert([self.stat(1, 3, '10.00')])
+        self.assertEqual(CampaignDailyStat.upsert([self.stat(1, 1, '12.50')]), (0, 1))
+        self.assertTotals(3, '17.50')
+        # The same row again changes nothing
+        CampaignDailyStat.upsert([self.stat(1, 1, '12.50')])
+        self.assertTotals(3, '17.50')
+
+    def test_last_row_for_a_day_wins(self):
+        CampaignDailyStat.upsert([self.stat(1, 3, '10.00'), self.stat(1, 6, '11.00')])
+        self.assertEqual(CampaignDailyStat.objects.get().leads, 6)
+        self.assertTotals(8, '16.00')
+
+    def test_totals_then_daily_stats(self):
+        # A sync or an undated import row, then a dated row for another day
+        self.assertEqual(Campaign.set_totals({self.campaign.pk: {'leads': 10, 'amount_spent': Decimal('40.00')}}, day=date(2024, 1, 2)), 1)
+        self.assertTotals(10, '40.00')
+        self.assertEqual(CampaignDailyStat.objects.get(date=date(2024, 1, 2)).leads, 8)
+        CampaignDailyStat.upsert([self.stat(1, 3, '10.00')])
+        self.assertTotals(13, '50.00')
+        # The next total from the platform already counts that day
+        Campaign.set_totals({self.campaign.pk: {'leads': 13, 'amount_spent': Decimal('50.00')}}, day=date(2024, 1, 2))
+        self.assertTotals(13, '50.00')
+        Campaign.set_totals({self.campaign.pk: {'leads': 12, 'amount_spent': Decimal('45.00')}}, day=date(2024, 1, 2))
+        self.assertTotals(12, '45.00')
+        stats = CampaignDailyStat.objects.order_by('date').values_list('leads', 'amount_spent')
+        self.assertEqual(list(stats), [(3, Decimal('10.00')), (7, Decimal('30.00'))])
+
+
+class CampaignReportImportTests(TestCase):
+    def setUp(self):
+        Campaign.objects.create(name='Spring', platform='Facebook')
+        Campaign.objects.create(name='Spring', platform='facebook ')
+        self.campaign = Campaign.objects.create(name='Summer', platform='TikTok')
+
+    def test_duplicate_name_and_platform(self):
+        importer = CampaignReportImport().run(io.StringIO(
+            'campaign,platform,leads,amount_spent\n'
+            'Spring,Facebook,5,10\n'
+            'Summer,TikTok,3,7.50\n'
+        ))
+        self.assertEqual((importer.matched, importer.error_count), (1, 1))
+        self.assertEqual(importer.errors[0]['line'], 2)
+        self.assertIn('Several campaigns', importer.errors[0]['error'])
+        self.assertEqual(Campaign.objects.filter(name='Spring', leads=5).count(), 0)
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.leads, self.campaign.amount_spent), (3, Decimal('7.50')))
+
+    def test_command_reports_csv_errors(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as report:
+            report.write('campaign,platform,leads,amount_spent\n')
+            report.write(f'Summer,TikTok,"{"1" * 200_000}",0\n')
+            report.flush()
+            with self.assertRaisesMessage(CommandError, 'field larger than field limit'):
+                call_command('import_campaign_report', report.name, stdout=io.StringIO(), stderr=io.StringIO())
+
+
+class ReportCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create(email='admin@example.com', role='Admin'))
+        self.user = User.objects.create(email='old@example.com', role='Client')
+        client = Client.objects.create(user=self.user)
+        Campaign.objects.create(client=client, amount_spent=Decimal('10'))
+        Payment.objects.create(client=client, amount=Decimal('100'), type='Ads Balance', status='Approved')
+
+    def emails(self, source):
+        response = self.api.get('/api/reports', {'source': source, 'dimensions': 'client'})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['client_email'] for row in response.json()['rows']]
+
+    def test_joined_tables_invalidate_the_cache(self):
+        for source in ('campaigns', 'payments'):
+            self.assertEqual(self.emails(source), ['old@example.com'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.email = 'new@example.com'
+            self.user.save()
+        for source in ('campaigns', 'payments'):
+            with self.subTest(source):
+                self.assertEqual(self.emails(source), ['new@example.com'])
+
+
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+
+    def login(self, number, **headers):
+        return self.api.post('/api/token', {'email': f'user{number}@example.com', 'password': 'wrong'}, **headers).status_code
+
+    @mock.patch.object(LoginIPThrottle, 'THROTTLE_RATES', {'login_ip': '2/min'})
+    def test_forwarded_for_does_not_change_the_address(self):
+        statuses = [self.login(number, HTTP_X_FORWARDED_FOR=f'10.0.0.{number}') for number in range(3)]
+        self.assertEqual(statuses, [401, 401, 429])
+
+    @mock.patch.object(LoginIPThrottle, 'THROTTLE_RATES', {'login_ip': '2/min'})
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1})
+    def test_address_added_by_the_proxy(self):
+        statuses = [self.login(number, HTTP_X_FORWARDED_FOR=f'203.0.113.9, 10.0.0.{number}') for number in range(3)]
+        self.assertEqual(statuses, [401, 401, 401])
+        # 10.0.0.0 has one request left
+        self.assertEqual([self.login(number, HTTP_X_FORWARDED_FOR='10.0.0.0') for number in (3, 4)], [401, 429])
+
+    @mock.patch.object(LoginIPThrottle, 'THROTTLE_RATES', {'login_ip': '2/min'})
+    def test_bucket_refills(self):
+        with mock.patch.object(TokenBucketThrottle, 'timer', return_value=1000.0):
+            self.assertEqual([self.login(number) for number in range(3)], [401, 401, 429])
+            self.assertEqual(ThrottleBucket.objects.get(key__contains='login_ip').full_at, 1060.0)
+        # One token back every 30 seconds
+        with mock.patch.object(TokenBucketThrottle, 'timer', return_value=1030.0):
+            self.assertEqual([self.login(number) for number in range(3, 5)], [401, 429])
+
+    @mock.patch.object(LoginIPThrottle, 'THROTTLE_RATES', {'login_ip': '2/min'})
+    def test_buckets_outlive_the_cache(self):
+        self.assertEqual([self.login(number) for number in range(2)], [401, 401])
+        # What culling the shared cache under a flood of new emails would do
+        cache.clear()
+        self.assertEqual(self.login(2), 429)
+
+    @mock.patch.object(LoginIPThrottle, 'THROTTLE_RATES', {'login_ip': '2/min'})
+    def test_full_buckets_are_pruned(self):
+        with mock.patch('api.throttling._pruned_at', 0), mock.patch.object(TokenBucketThrottle, 'timer', return_value=1000.0):
+            self.login(0)
+        self.assertEqual(ThrottleBucket.objects.filter(key__contains='login_ip').count(), 1)
+        with mock.patch('api.throttling._pruned_at', 0), mock.patch.object(TokenBucketThrottle, 'timer', return_value=1100.0):
+            self.login(1, REMOTE_ADDR='10.0.0.9')
+        self.assertEqual(list(ThrottleBucket.objects.filter(key__contains='login_ip').values_list('key', flat=True)), ['throttle_login_ip_10.0.0.9'])
+
+
+class RoleScopeTests(TestCase):
+    """
+    Every role sees, in lists and detail lookups alike, only the rows
+    api.scopes gives it; other rows are a 404, not a 403.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        def user(email, role):
+            return User.objects.create(email=email, role=role)
+
+        cls.users = {name: user(f'{name}@example.com', role) for name, role in (
+            ('admin', 'Admin'), ('manager', 'Manager'), ('buyer', 'Media Buyer'), ('other_buyer', 'Media Buyer'),
+            ('client', 'Client'), ('other_client', 'Client'), ('builder', 'Page Builder'), ('voice', 'Voice Over'),
+            ('editor', 'Video Editor'),
+        )}
+        client = Client.objects.create(user=cls.users['client'])
+        other_client = Client.objects.create(user=cls.users['other_client'])
+        buyer, other_buyer = cls.users['buyer'], cls.users['other_buyer']
+        cls.rows = {
+            'campaign': (Campaign.objects.create(client=client, media_buyer=buyer), Campaign.objects.create(client=other_client, media_buyer=other_buyer)),
+            'product': (Product.objects.create(client=client, media_buyer=buyer), Product.objects.create(client=other_client, media_buyer=other_buyer)),
+            'payment': (Payment.objects.create(client=client, amount=Decimal('10')), Payment.objects.create(client=other_client, amount=Decimal('10'))),
+            'page': (Page.objects.create(media_buyer=buyer, creator=cls.users['builder']), Page.objects.create(media_buyer=other_buyer)),
+            'voice-over': (VoiceOver.objects.create(media_buyer=buyer, creator=cls.users['voice']), VoiceOver.objects.create(media_buyer=other_buyer)),
+            'creative': (Creative.objects.create(media_buyer=buyer, creator=cls.users['editor']), Creative.objects.create(media_buyer=other_buyer)),
+        }
+
+    def as_user(self, name):
+        api = APIClient()
+        api.force_authenticate(self.users[name])
+        return api
+
+    def listed(self, name, kind):
+        response = self.as_user(name).get(f'/api/{kind}s')
+        self.assertEqual(response.status_code, 200, response.content)
+        return {row['id'] for row in response.json()['results']}
+
+    def assertScope(self, name, kind, own):
+        mine, theirs = self.rows[kind]
+        with self.subTest(user=name, kind=kind):
+            self.assertEqual(self.listed(name, kind), {str(mine.pk)} if own else set())
+            api = self.as_user(name)
+            self.assertEqual(api.get(f'/api/{kind}/{mine.pk}').status_code, 200 if own else 404)
+            self.assertEqual(api.get(f'/api/{kind}/{theirs.pk}').status_code, 404)
+
+    def test_admin_and_manager_see_everything(self):
+        for name in ('admin', 'manager'):
+            for kind, rows in self.rows.items():
+                with self.subTest(user=name, kind=kind):
+                    self.assertEqual(self.listed(name, kind), {str(row.pk) for row in rows})
+
+    def test_media_buyer_sees_own(self):
+        for kind in ('campaign', 'product', 'page', 'voice-over', 'creative'):
+            self.assertScope('buyer', kind, own=True)
+
+    def test_client_sees_own_client(self):
+        for kind in ('campaign', 'product', 'payment'):
+            self.assertScope('client', kind, own=True)
+
+    def test_client_has_no_production_tasks(self):
+        api = self.as_user('client')
+        for kind in ('page', 'voice-over', 'creative'):
+            with self.subTest(kind=kind):
+                self.assertEqual(api.get(f'/api/{kind}s').status_code, 403)
+                self.assertEqual(api.get(f'/api/{kind}/{self.rows[kind][0].pk}').status_code, 403)
+                self.assertEqual(api.post(f'/api/{kind}s', {}).status_code, 403)
+
+    def test_creators_see_assigned(self):
+        for name, kind in (('builder', 'page'), ('voice', 'voice-over'), ('editor', 'creative')):
+            self.assertScope(name, kind, own=True)
+            api = self.as_user(name)
+            with self.subTest(user=name, kind=kind):
+                self.assertEqual(api.patch(f'/api/{kind}/{self.rows[kind][0].pk}', {'status': 'Done'}).status_code, 200)
+                self.assertEqual(api.post(f'/api/{kind}s', {}).status_code, 403)
+                self.assertEqual(api.delete(f'/api/{kind}/{self.rows[kind][0].pk}').status_code, 403)
+
+    def test_campaign_writes(self):
+        for name in ('client', 'builder', 'voice', 'editor'):
+            with self.subTest(user=name):
+                self.assertEqual(self.as_user(name).post('/api/campaigns', {'name': 'New'}).status_code, 403)
+        self.assertEqual(self.as_user('client').patch(f"/api/campaign/{self.rows['campaign'][0].pk}", {'name': 'Mine'}).status_code, 403)
+        response = self.as_user('buyer').post('/api/campaigns', {'name': 'New', 'media_buyer': str(self.users['other_buyer'].pk)})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['media_buyer'], str(self.users['buyer'].pk))
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    """
+    A second alias opened on the test database stands in for the replica, so
+    every query can be traced to the connection that ran it. Rows are
+    committed for the second connection to see them.
+    """
+
+    def setUp(self):
+        connections.settings[REPLICA] = {**connections['default'].settings_dict, 'TEST': {'MIRROR': 'default'}}
+        self.addCleanup(self.remove_replica)
+        self.use_databases(connections.settings)
+        cache.clear()
+
+        self.admin = User.objects.create(email='admin@example.com', role='Admin')
+        self.campaign = Campaign.objects.create(name='Launch', leads=2, amount_spent=Decimal('10'))
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def use_databases(self, databases):
+        # The router looks for the alias in settings.DATABASES
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            override = override_settings(DATABASES=dict(databases))
+            override.enable()
+        self.addCleanup(override.disable)
+
+    def remove_replica(self):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def request(self, method, url, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primary, CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = getattr(self.api, method)(url, **kwargs)
+        self.assertLess(response.status_code, 300, response.content)
+        return len(primary), len(replica)
+
+    def test_reads_go_to_the_replica(self):
+        for url in ('/api/campaigns', f'/api/campaign/{self.campaign.pk}', '/api/clients'):
+            with self.subTest(url):
+                primary, replica = self.request('get', url)
+                self.assertEqual(primary, 0)
+                self.assertGreater(replica, 0)
+
+    def test_writes_and_reads_after_them_go_to_the_primary(self):
+        primary, replica = self.request('post', '/api/campaigns', data={'name': 'Second', 'leads': 1}, format='json')
+        self.assertGreater(primary, 0)
+        # The response is read back after the write, from the primary
+        self.assertEqual(replica, 0)
+
+    def test_user_is_pinned_to_the_primary_after_a_write(self):
+        self.request('patch', f'/api/campaign/{self.campaign.pk}', data={'leads': 5}, format='json')
+        primary, replica = self.request('get', f'/api/campaign/{self.campaign.pk}')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # Other users are not pinned, nor is this one once the pin expires
+        other = APIClient()
+        other.force_authenticate(User.objects.create(email='manager@example.com', role='Manager'))
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            self.assertEqual(other.get('/api/campaigns').status_code, 200)
+        self.assertGreater(len(replica), 0)
+        cache.clear()
+        primary, replica = self.request('get', f'/api/campaign/{self.campaign.pk}')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_reports_are_computed_on_the_primary(self):
+        # Their results are cached under table versions the primary moves
+        primary, replica = self.request('get', '/api/reports', data={'source': 'campaigns', 'dimensions': 'status'})
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_without_a_replica_alias_reads_stay_on_default(self):
+        self.use_databases({'default': connections['default'].settings_dict})
+        primary, replica = self.request('get', '/api/campaigns')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+
+class MediaAccessTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root, MEDIA_SENDFILE='')
+        media.enable()
+        self.addCleanup(media.disable)
+        for name in ('payment_proofs/p.txt', 'products/p.txt'):
+            os.makedirs(os.path.join(media_root, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(media_root, name), 'w') as f:
+                f.write(name)
+
+    def test_public_files_are_served(self):
+        response = self.client.get('/media/products/p.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'products/p.txt')
+
+    def test_payment_proofs_need_a_user(self):
+        self.assertEqual(self.client.get('/media/payment_proofs/p.txt').status_code, 401)
+
+    def test_dot_segments_do_not_bypass_the_check(self):
+        for url in (
+            '/media/products/../payment_proofs/p.txt',
+            '/media/./payment_proofs/p.txt',
+            '/media/products/%2e%2e/payment_proofs/p.txt',
+            '/media/products/.%2E/payment_proofs/p.txt',
+            '/media//payment_proofs/p.txt',
+            '/media/payment_proofs//p.txt',
+            '/media/../media/payment_proofs/p.txt',
+        ):
+            with self.subTest(url):
+                self.assertIn(self.client.get(url).status_code, (401, 404))
+
+
+class UploadSessionTests(TestCase):
+    content = b'proof of payment'
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        paths = override_settings(MEDIA_ROOT=os.path.join(root, 'media'), UPLOAD_SESSION_ROOT=os.path.join(root, 'sessions'))
+        paths.enable()
+        self.addCleanup(paths.disable)
+        self.user = User.objects.create(email='client@example.com', role='Client')
+        Client.objects.create(user=self.user)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def upload(self):
+        response = self.api.post('/api/uploads', {
+            'target': 'Payment Proof', 'filename': 'proof.txt',
+            'size': len(self.content), 'sha256': hashlib.sha256(self.content).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        pk = response.json()['id']
+        response = self.api.put(f'/api/upload/{pk}', self.content, content_type='application/octet-stream',
+                                HTTP_CONTENT_RANGE=f'bytes 0-{len(self.content) - 1}/{len(self.content)}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return pk
+
+    def complete(self, pk):
+        response = self.api.post(f'/api/upload/{pk}/complete')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['name']
+
+    def test_gc_keeps_completed_uploads_until_they_are_used(self):
+        pk = self.upload()
+        name = self.complete(pk)
+        call_command('gc_media', min_age=0, workers=1, stdout=open(os.devnull, 'w'))
+        self.assertTrue(default_storage.exists(name))
+
+        response = self.api.post('/api/payments', {'proof_upload': pk, 'amount': '10', 'type': 'Ads Balance'}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Payment.objects.get().proof.name, name)
+
+    def test_invalid_filename_is_refused_before_the_upload(self):
+        for filename in ('../proof.txt', '/etc/proof.txt', '..'):
+            with self.subTest(filename=filename):
+                response = self.api.post('/api/uploads', {
+                    'target': 'Payment Proof', 'filename': filename,
+                    'size': len(self.content), 'sha256': hashlib.sha256(self.content).hexdigest(),
+                }, format='json')
+                self.assertEqual(response.status_code, 400, response.content)
+                self.assertIn('filename', response.json())
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_gc_lookup_fits_old_sqlite(self):
+        index = ReferenceIndex()
+        self.addCleanup(index.close)
+        # SQLITE_LIMIT_VARIABLE_NUMBER before SQLite 3.32
+        index.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        names = [f'products/{number}.png' for number in range(GC_BATCH_SIZE)]
+        index.add(names[::2])
+        self.assertEqual(index.missing(names), names[1::2])
+
+    def test_complete_racing_a_finished_complete(self):
+        pk = self.upload()
+        stale = UploadSession.objects.get(pk=pk)
+        name = self.complete(pk)
+        # The second request read the session before the first one finished
+        with mock.patch('api.uploads.get_object_or_404', return_value=stale):
+            self.assertEqual(self.complete(pk), name)
+
+    def test_complete_racing_a_complete_that_has_not_removed_the_file(self):
+        pk = self.upload()
+        stale = UploadSession.objects.get(pk=pk)
+        temp_path = stale.temp_path
+        with mock.patch('api.uploads.os.remove'):
+            name = self.complete(pk)
+        self.assertTrue(os.path.exists(temp_path))
+        with mock.patch('api.uploads.get_object_or_404', return_value=stale):
+            self.assertEqual(self.complete(pk), name)
+        self.assertEqual(UploadSession.objects.get(pk=pk).name, name)
+
+
+
+class ProductImageTests(TestCase):
+    def setUp(self):
+        # Pillow is only needed where variants are rendered
+        from PIL import Image
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        media = override_settings(MEDIA_ROOT=root)
+        media.enable()
+        self.addCleanup(media.disable)
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(buffer, 'PNG')
+        self.image = Product._meta.get_field('image').storage.save('products/red.png', ContentFile(buffer.getvalue()))
+
+    def test_save_without_a_new_image_reads_nothing(self):
+        with mock.patch('api.models.schedule_variants'):
+            Product.objects.create(name='Lamp', image=self.image)
+        product = Product.objects.get()
+        for update_fields in (None, ['name']):
+            with self.subTest(update_fields=update_fields), CaptureQueriesContext(connection) as queries:
+                product.name = 'Desk lamp'
+                product.save(update_fields=update_fields)
+            self.assertFalse([query['sql'] for query in queries if query['sql'].startswith('SELECT')])
+        with CaptureQueriesContext(connection) as queries:
+            Product.objects.only('name').get().save()
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('SELECT')]), 1)
+
+    def test_new_image_clears_and_schedules_the_variants(self):
+        with mock.patch('api.models.schedule_variants'):
+            product = Product.objects.create(name='Lamp', image=self.image)
+        Product.objects.filter(pk=product.pk).update(image_variants={'thumb_webp': 'old.webp'})
+        product = Product.objects.get()
+        product.image = 'products/other.png'
+        with mock.patch('api.models.schedule_variants') as schedule, self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        schedule.assert_called_once_with(product.pk, 'products/other.png')
+        self.assertEqual(Product.objects.get().image_variants, {})
+
+    def test_backfill_renders_lost_jobs(self):
+        # Jobs scheduled but never run, as after a restart
+        with mock.patch('api.models.schedule_variants'):
+            products = [Product.objects.create(name=f'Lamp {number}', image=self.image) for number in range(2)]
+        out = io.StringIO()
+        with mock.patch('api.images.render_variants', wraps=render_variants) as render:
+            call_command('generate_image_variants', stdout=out)
+        render.assert_called_once()
+        self.assertIn('Rendered variants of 1 images, 0 failed', out.getvalue())
+        for product in products:
+            product.refresh_from_db()
+            self.assertEqual(set(product.image_variants), {'thumb_webp', 'thumb_jpg', 'medium_webp', 'medium_jpg'})
+            self.assertTrue(all(default_storage.exists(name) for name in product.image_variants.values()))
+
+
+class TokenClaimsTests(TestCase):
+    """
+    A role or account change reaches tokens issued before it, even after the
+    shared cache has lost track of it.
+    """
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.admin = User.objects.create(email='admin@example.com', role='Admin')
+        self.refresh = CustomTokenObtainPairSerializer.get_token(self.admin)
+        # Claims issued a second before any change made by the test
+        self.refresh['claims_at'] -= 1
+        self.api = APIClient()
+
+    def demote(self, **changes):
+        for field, value in {'role': 'Media Buyer', **changes}.items():
+            setattr(self.admin, field, value)
+        self.admin.save()
+        # What a restart, an eviction or another worker's cache would see
+        cache.clear()
+        user_cache.clear()
+
+    def get_clients(self, token):
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.api.get('/api/clients').status_code
+
+    def test_access_token_after_the_change(self):
+        access = self.refresh.access_token
+        self.assertEqual(self.get_clients(access), 200)
+        self.demote()
+        user_cache.clear()
+        self.assertEqual(self.get_clients(access), 403)
+
+    def test_refresh_carries_the_current_role(self):
+        self.demote()
+        response = self.api.post('/api/token/refresh', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 200, response.content)
+        for token in (AccessToken(response.json()['access']), RefreshToken(response.json()['refresh'])):
+            self.assertEqual(token['role'], 'Media Buyer')
+            self.assertGreater(token['claims_at'], self.refresh['claims_at'])
+
+    def test_refresh_of_an_inactive_user(self):
+        self.demote(is_active=False)
+        response = self.api.post('/api/token/refresh', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'no_active_account')
+
+
+
+class TokenBlacklistTests(TestCase):
+    """
+    A refresh token is spent by its rotation, in this process and in one that
+    only has the database to go by.
+    """
+
+    def setUp(self):
+        cache.clear()
+        token_blacklist.reload()
+        self.refresh = CustomTokenObtainPairSerializer.get_token(User.objects.create(email='admin@example.com', role='Admin'))
+        self.api = APIClient()
+
+    def refresh_with(self, token):
+        return self.api.post('/api/token/refresh', {'refresh': str(token)})
+
+    def test_rotated_token_is_rejected_on_replay(self):
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 200)
+        response = self.refresh_with(self.refresh)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+
+    def test_replay_on_another_worker(self):
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 200)
+        # A worker whose filter predates the rotation and whose cache lost the key
+        token_blacklist.reload()
+        cache.clear()
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+    def test_replay_before_the_filter_is_rebuilt(self):
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 200)
+        # Another worker's filter has not seen the rotation, the shared cache has
+        with mock.patch.object(BloomFilter, '__contains__', return_value=False):
+            self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+    def test_blacklisted_token_is_rejected(self):
+        # Revoked without being rotated
+        RevocableRefreshToken(str(self.refresh)).blacklist()
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+        with self.assertRaises(TokenError):
+            RevocableRefreshToken(str(self.refresh))
+
+    def test_false_positive_falls_back_to_the_database(self):
+        jti = self.refresh['jti']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(token_blacklist.is_revoked(jti))
+        self.assertEqual(len(queries), 0)
+        with mock.patch.object(BloomFilter, '__contains__', return_value=True), CaptureQueriesContext(connection) as queries:
+            self.assertFalse(token_blacklist.is_revoked(jti))
+            self.assertEqual(self.refresh_with(self.refresh).status_code, 200)
+        self.assertTrue(any('api_revokedtoken' in query['sql'] for query in queries))
+
+
+class FakeAdapter(PlatformAdapter):
+    batch_size = 10
+
+    async def fetch(self, campaigns):
+        return {str(pk): {'leads': 1, 'amount_spent': Decimal('2.00')} for pk, _ in campaigns}
+
+
+class SyncEngineTests(TestCase):
+    campaigns = [(pk, f'Campaign {pk}') for pk in range(200)]
+
+    def sync(self, set_totals):
+        engine = SyncEngine(concurrency=4, batch_size=5, retries=0, timeout=1)
+        with mock.patch.object(Campaign, 'set_totals', side_effect=set_totals):
+            # A hung engine fails the test instead of the run
+            asyncio.run(asyncio.wait_for(engine._run({FakeAdapter: self.campaigns}), 10))
+        return engine
+
+    def test_writes_every_campaign(self):
+        engine = self.sync(len)
+        self.assertEqual(engine.summary(), {'fetched': 200, 'updated': 200, 'retried': 0, 'errors': 0})
+
+    def test_writer_failure_stops_the_workers(self):
+        with self.assertRaises(DatabaseError):
+            self.sync(DatabaseError('database is locked'))
+
+
+class HTTPClientTests(TestCase):
+    def fetch(self, *responses, requests=1):
+        # Serves the raw responses in order, each on whichever connection asks
+        # next; a response without a length is ended by closing the connection
+        responses = list(responses)
+        connections = []
+
+        async def handle(reader, writer):
+            connections.append(writer)
+            try:
+                while responses:
+                    await reader.readuntil(b'\r\n\r\n')
+                    response = responses.pop(0)
+                    writer.write(response)
+                    await writer.drain()
+                    if b'Content-Length' not in response and b'chunked' not in response:
+                        break
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        async def run():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            client = HTTPClient(timeout=2)
+            results = []
+            try:
+                for _ in range(requests):
+                    try:
+                        results.append(await client.get_json(f'http://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1/insights'))
+                    except SyncError as error:
+                        results.append(error)
+            finally:
+                await client.close()
+                server.close()
+                await server.wait_closed()
+            return results
+
+        return asyncio.run(run()), len(connections)
+
+    def test_keep_alive_connection_is_reused(self):
+        response = b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 8\r\n\r\n{"a": 1}'
+        results, connections = self.fetch(response, response, requests=2)
+        self.assertEqual(results, [{'a': 1}, {'a': 1}])
+        self.assertEqual(connections, 1)
+
+    def test_rate_limited(self):
+        (error,), _ = self.fetch(b'HTTP/1.1 429 Too Many Requests\r\nRetry-After: 7\r\nContent-Length: 0\r\n\r\n')
+        self.assertIsInstance(error, SyncError)
+        self.assertTrue(error.retryable)
+        self.assertEqual(error.retry_after, 7.0)
+
+    def test_chunked_body(self):
+        response = b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\n{"a":\r\n3\r\n 1}\r\n0\r\n\r\n'
+        results, connections = self.fetch(response, response, requests=2)
+        self.assertEqual(results, [{'a': 1}, {'a': 1}])
+        self.assertEqual(connections, 1)
+
+    def test_body_ended_by_close(self):
+        response = b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{"a": 1}'
+        results, connections = self.fetch(response, response, requests=2)
+        self.assertEqual(results, [{'a': 1}, {'a': 1}])
+        self.assertEqual(connections, 2)
+
+    def test_malformed_response_is_retryable(self):
+        for response in (b'garbage\r\n\r\n', b'HTTP/1.1 OK\r\n\r\n', b'HTTP/1.1 200 OK\r\nX-Padding: ' + b'a' * 100_000 + b'\r\n\r\n'):
+            with self.subTest(response=response[:30]):
+                (error,), _ = self.fetch(response)
+                self.assertIsInstance(error, SyncError)
+                self.assertTrue(error.retryable)
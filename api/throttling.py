@@ -0,0 +1,87 @@
+import hashlib
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Least
+from rest_framework.throttling import SimpleRateThrottle
+
+from api.models import ThrottleBucket
+
+_pruned_at = 0
+
+
+def _prune(now):
+    # Buckets that are full again; at most once per THROTTLE_PRUNE_SECONDS per
+    # process, workers racing on it only delete the same rows twice
+    global _pruned_at
+    if now - _pruned_at < settings.THROTTLE_PRUNE_SECONDS:
+        return
+    _pruned_at = now
+    ThrottleBucket.objects.filter(full_at__lt=now).delete()
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket on top of DRF's rate strings: "10/min" is a bucket of 10
+    requests refilled at 10 per minute, so a client may burst up to the rate and
+    then gets one request per refill interval. Buckets are ThrottleBucket rows,
+    which every worker shares. A token is taken by one conditional UPDATE, so
+    concurrent requests cannot spend the same one, and unlike cache entries the
+    rows are never culled while they still hold a limit.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        _prune(self.now)
+        capacity = float(self.num_requests)
+        refill = capacity / self.duration
+        buckets = ThrottleBucket.objects.filter(key=self.key)
+        available = Least(Value(capacity), F('tokens') + (Value(self.now) - F('updated_at')) * Value(refill))
+        if self.take(buckets, available, capacity, refill):
+            return self.throttle_success()
+        if not buckets.exists():
+            # First request of this client, unless a concurrent one just
+            # started its bucket, which the second take then sees
+            ThrottleBucket.objects.bulk_create([ThrottleBucket(key=self.key, tokens=capacity, updated_at=self.now, full_at=self.now)], ignore_conflicts=True)
+            if self.take(buckets, available, capacity, refill):
+                return self.throttle_success()
+        tokens = buckets.annotate(available=available).values_list('available', flat=True).first() or 0
+        self.retry_after = (1 - tokens) / refill
+        return self.throttle_failure()
+
+    def take(self, buckets, available, capacity, refill):
+        return buckets.alias(available=available).filter(available__gte=1).update(
+            tokens=available - 1,
+            updated_at=self.now,
+            full_at=Value(self.now) + (Value(capacity) - available + 1) / Value(refill),
+        )
+
+    def throttle_success(self):
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginEmailThrottle(TokenBucketThrottle):
+    scope = 'login_email'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email')
+        if not email or not isinstance(email, str):
+            return None
+        ident = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
@@ -0,0 +1,143 @@
+from contextlib import suppress
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import generics, status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from api.models import UploadSession
+from api.serializers import UploadSessionSerializer
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+CHUNK_SIZE = 64 * 1024
+# Roles allowed to attach an upload to each target, as on the target's views
+TARGET_ROLES = {
+    'Payment Proof': {'Admin', 'Manager', 'Client'},
+    'Product Image': {'Admin', 'Manager', 'Client', 'Media Buyer'},
+}
+
+
+def _conflict(session, error):
+    return Response({'error': error, 'received': session.received}, status=status.HTTP_409_CONFLICT)
+
+
+class UploadSessionListView(generics.CreateAPIView):
+    """
+    POST {target, filename, size, sha256} opens a session. The file is then sent
+    with PUT upload/<id> in chunks carrying "Content-Range: bytes start-end/size";
+    GET upload/<id> returns how many bytes were received so an interrupted
+    upload resumes from there. POST upload/<id>/complete checks the SHA-256 and
+    stores the file; its id can then be passed as proof_upload or image_upload.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        if self.request.user.role not in TARGET_ROLES[serializer.validated_data['target']]:
+            raise PermissionDenied()
+        session = serializer.save(user=self.request.user)
+        os.makedirs(settings.UPLOAD_SESSION_ROOT, exist_ok=True)
+        open(session.temp_path, 'wb').close()
+
+
+class UploadSessionDetailView(generics.RetrieveDestroyAPIView):
+    serializer_class = UploadSessionSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def put(self, request, pk):
+        session = self.get_object()
+        if session.status != 'Open':
+            return _conflict(session, 'Upload already completed.')
+        match = CONTENT_RANGE_RE.match(request.META.get('HTTP_CONTENT_RANGE', ''))
+        if not match:
+            return Response({'error': 'Expected a "Content-Range: bytes start-end/size" header.'}, status=status.HTTP_400_BAD_REQUEST)
+        start, end, total = match.groups()
+        start, end = int(start), int(end)
+        if end < start or end >= session.size or total not in ('*', str(session.size)):
+            return Response({'error': 'Range outside of the declared size.'}, status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        if start != session.received:
+            return _conflict(session, f'Expected the chunk starting at byte {session.received}.')
+
+        # Copy the body straight to the session file; request.data is never
+        # touched so Django does not buffer or parse it
+        remaining = end - start + 1
+        with open(session.temp_path, 'r+b') as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = request.stream.read(min(CHUNK_SIZE, remaining)) if request.stream else b''
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        if remaining:
+            return Response({'error': 'Chunk shorter than its Content-Range.', 'received': session.received}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Only one request can move the offset past this chunk
+        updated = UploadSession.objects.filter(pk=session.pk, status='Open', received=start).update(
+            received=end + 1, updated_at=timezone.now()
+        )
+        session.refresh_from_db()
+        if not updated:
+            return _conflict(session, 'Another chunk was written concurrently.')
+        return Response(self.get_serializer(session).data)
+
+
+class UploadSessionCompleteView(generics.GenericAPIView):
+    serializer_class = UploadSessionSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def post(self, request, pk):
+        session = get_object_or_404(self.get_queryset(), pk=pk)
+        if session.status == 'Complete':
+            return Response(self.get_serializer(session).data)
+        if session.received != session.size:
+            return _conflict(session, f'Received {session.received} of {session.size} bytes.')
+
+        try:
+            digest = hashlib.sha256()
+            with open(session.temp_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            if digest.hexdigest() != session.sha256:
+                # Start over rather than keep corrupted bytes
+                with open(session.temp_path, 'wb'):
+                    pass
+                session.received = 0
+                session.save(update_fields=['received', 'updated_at'])
+                return Response({'error': 'Checksum mismatch, upload the file again.', 'received': 0}, status=status.HTTP_400_BAD_REQUEST)
+
+            field = session.target_field()
+            with open(session.temp_path, 'rb') as f:
+                name = field.storage.save(field.generate_filename(None, session.filename), File(f, name=session.filename))
+        except FileNotFoundError:
+            # A concurrent request completed the session and removed the file
+            return self.completed(session)
+
+        # Only one of concurrent requests moves the session to Complete; a
+        # losing copy is left unreferenced for gc_media
+        if UploadSession.objects.filter(pk=session.pk, status='Open').update(name=name, status='Complete', updated_at=timezone.now()):
+            with suppress(FileNotFoundError):
+                os.remove(session.temp_path)
+        return self.completed(session)
+
+    def completed(self, session):
+        session.refresh_from_db()
+        if session.status != 'Complete':
+            return _conflict(session, 'The upload file is missing, upload it again.')
+        return Response(self.get_serializer(session).data)
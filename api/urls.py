@@ -1,6 +1,9 @@
 from django.urls import path
 from rest_framework_simplejwt import views as jwt_views
 from .views import *
+from .imports import CampaignReportImportView
+from .reports import ReportView
+from .uploads import UploadSessionCompleteView, UploadSessionDetailView, UploadSessionListView
 
 urlpatterns = [
     path('token', CustomTokenObtainPairView.as_view(), name ='token_obtain_pair'),
@@ -17,10 +20,16 @@ urlpatterns = [
     path('product/<uuid:pk>', ProductDetailView.as_view(), name='product-detail'),
     path('campaigns', CampaignListView.as_view(), name='campaign-list'),
     path('campaign/<uuid:pk>', CampaignDetailView.as_view(), name='campaign-detail'),
+    path('campaign-stats', CampaignDailyStatListView.as_view(), name='campaign-stat-list'),
+    path('campaign-reports/import', CampaignReportImportView.as_view(), name='campaign-report-import'),
+    path('reports', ReportView.as_view(), name='reports'),
     path('pages', PageListView.as_view(), name='page-list'),
     path('page/<uuid:pk>', PageDetailView.as_view(), name='page-detail'),
     path('voice-overs', VoiceOverListView.as_view(), name='voice-over-list'),
     path('voice-over/<uuid:pk>', VoiceOverDetailView.as_view(), name='voice-over-detail'),
     path('creatives', CreativeListView.as_view(), name='creative-list'),
-    path('creative/<uuid:pk>', CreativeDetailView.as_view(), name='creative-detail')
+    path('creative/<uuid:pk>', CreativeDetailView.as_view(), name='creative-detail'),
+    path('uploads', UploadSessionListView.as_view(), name='upload-list'),
+    path('upload/<uuid:pk>', UploadSessionDetailView.as_view(), name='upload-detail'),
+    path('upload/<uuid:pk>/complete', UploadSessionCompleteView.as_view(), name='upload-complete')
 ]
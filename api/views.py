@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.http import Http404
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
@@ -7,42 +9,85 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, BasePermission
 from api.models import *
 from api.serializers import *
+from api.filters import KeyedOrderingFilter, LookupFilter
+from api.prefetch import SerializerPrefetchMixin
+from api.routers import ReplicaReadMixin
+from api.scopes import RoleScopedMixin, scope_queryset
+from api.authentication import token_claims
+from api.throttling import LoginEmailThrottle, LoginIPThrottle
 from decimal import Decimal
+from types import MappingProxyType
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 
 
-class UserClientPermission(BasePermission):
-    allowed_roles = {'Admin'}
+class RolePermission(BasePermission):
+    """
+    Allows allowed_roles, plus method_roles[method] on that HTTP method. The
+    role sets are frozen per method when the class is defined.
+    """
+    allowed_roles = frozenset()
+    method_roles = {}
+    roles_by_method = MappingProxyType({})
 
-    def has_permission(self, request, view):
-        return request.user and request.user.role in self.allowed_roles
-
-class IsAdminManagerUser(BasePermission):
-    allowed_roles = {'Admin', 'Manager'}
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.roles_by_method = MappingProxyType({
+            method: frozenset(cls.allowed_roles).union(cls.method_roles.get(method, ()))
+            for method in ('GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE')
+        })
 
     def has_permission(self, request, view):
-        return request.user and request.user.role in self.allowed_roles
+        roles = self.roles_by_method.get(request.method, frozenset())
+        return getattr(request.user, 'role', None) in roles
 
-class PaymentPermission(BasePermission):
-    allowed_roles = {'Admin', 'Manager', 'Client'}
+class UserClientPermission(RolePermission):
+    allowed_roles = frozenset({'Admin'})
 
-    def has_permission(self, request, view):
-        return request.user and request.user.role in self.allowed_roles
+class IsAdminManagerUser(RolePermission):
+    allowed_roles = frozenset({'Admin', 'Manager'})
+
+class PaymentPermission(RolePermission):
+    allowed_roles = frozenset({'Admin', 'Manager', 'Client'})
     
-class ProductPermission(BasePermission):
-    allowed_roles = {'Admin', 'Manager', 'Client'}
-    media_buyer_allowed_methods = {'GET', 'PUT'}
+class ProductPermission(RolePermission):
+    allowed_roles = frozenset({'Admin', 'Manager', 'Client'})
+    method_roles = {'GET': {'Media Buyer'}, 'PUT': {'Media Buyer'}}
 
-    def has_permission(self, request, view):
-        if request.method in self.media_buyer_allowed_methods:
-            self.allowed_roles.add('Media Buyer')
-        else:
-            self.allowed_roles.discard('Media Buyer')
-        return request.user and request.user.role in self.allowed_roles
+class CampaignStatPermission(RolePermission):
+    allowed_roles = frozenset({'Admin', 'Manager', 'Media Buyer'})
+    method_roles = {'GET': {'Client'}, 'HEAD': {'Client'}, 'OPTIONS': {'Client'}}
+
+class CampaignPermission(RolePermission):
+    allowed_roles = frozenset({'Admin', 'Manager', 'Media Buyer'})
+    method_roles = {'GET': {'Client'}, 'HEAD': {'Client'}, 'OPTIONS': {'Client'}}
+
+# Media buyers order pages, voice-overs and creatives; the creator assigned to
+# one may read and update it, never create or delete
+CREATOR_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'PATCH')
+
+class PagePermission(RolePermission):
+    allowed_roles = frozenset({'Admin', 'Manager', 'Media Buyer'})
+    method_roles = dict.fromkeys(CREATOR_METHODS, {'Page Builder'})
+
+class VoiceOverPermission(RolePermission):
+    allowed_roles = frozenset({'Admin', 'Manager', 'Media Buyer'})
+    method_roles = dict.fromkeys(CREATOR_METHODS, {'Voice Over'})
+
+class CreativePermission(RolePermission):
+    allowed_roles = frozenset({'Admin', 'Manager', 'Media Buyer'})
+    method_roles = dict.fromkeys(CREATOR_METHODS, {'Video Editor'})
     
     
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # Lets CachedJWTAuthentication authenticate without loading the user
+        token = super().get_token(user)
+        for claim, value in token_claims(user).items():
+            token[claim] = value
+        return token
+
     def validate(self, attrs):
         data = super().validate(attrs)
         refresh = self.get_token(self.user)
@@ -53,15 +98,18 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    # Rejected before PBKDF2 runs, so a login flood cannot starve the workers
+    throttle_classes = (LoginIPThrottle, LoginEmailThrottle)
 
-class UserListView(generics.ListCreateAPIView):
+class UserListView(ReplicaReadMixin, SerializerPrefetchMixin, generics.ListCreateAPIView):
     permission_classes = (IsAuthenticated, UserClientPermission)
     serializer_class = UserSerializer
+    cursor_ordering = ('-date_joined', '-id')
 
     def get_queryset(self):
         return User.objects.exclude(Q(pk=self.request.user.pk) | Q(role="Client"))
     
-class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
+class UserDetailView(ReplicaReadMixin, SerializerPrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = (IsAuthenticated, UserClientPermission)
     serializer_class = UserSerializer
 
@@ -108,9 +156,10 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
 #         return Response(status=status.HTTP_204_NO_CONTENT)
     
 
-class BaseUserListView(generics.ListAPIView):
+class BaseUserListView(ReplicaReadMixin, SerializerPrefetchMixin, generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]  # Common permission for all subclasses
+    cursor_ordering = ('-date_joined', '-id')
 
     def get_queryset(self):
         return User.objects.filter(role=self.user_role)
@@ -124,11 +173,13 @@ class PageBuilderListView(BaseUserListView):
     permission_classes = [PaymentPermission]
     
 
-class ClientListView(generics.ListCreateAPIView):
-    queryset = Client.objects.all()
+class ClientListView(ReplicaReadMixin, SerializerPrefetchMixin, generics.ListCreateAPIView):
     serializer_class = ClientSerializer
     permission_classes = (IsAuthenticated, UserClientPermission)
 
+    def get_queryset(self):
+        return Client.objects.with_balances()
+
     def create(self, request):
         user_data = {
             'first_name': request.data.get('user[first_name]', ''),
@@ -147,14 +198,17 @@ class ClientListView(generics.ListCreateAPIView):
             commission_data = request.data.get('commission', '')
             commission = Decimal(commission_data) if commission_data else 0
             client = Client.objects.create(user=user_instance, commission=commission)
+            client = Client.objects.with_balances().get(pk=client.pk)
             return Response(ClientSerializer(client).data, status=status.HTTP_201_CREATED)
         return Response(user_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class ClientDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Client.objects.all()
+class ClientDetailView(ReplicaReadMixin, SerializerPrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ClientSerializer
     permission_classes = (IsAuthenticated, UserClientPermission)
 
+    def get_queryset(self):
+        return Client.objects.with_balances()
+
     def update(self, request, pk):
         client = Client.objects.filter(pk=pk).first()
         if client:
@@ -175,6 +229,7 @@ class ClientDetailView(generics.RetrieveUpdateDestroyAPIView):
             commission_data = request.data.get('commission', '')
             client.commission = Decimal(commission_data) if commission_data else 0
             client.save()
+            client = Client.objects.with_balances().get(pk=client.pk)
             return Response(ClientSerializer(client).data, status=status.HTTP_200_OK)
         return Response({'error': 'Client not found!'}, status=status.HTTP_404_NOT_FOUND)
     
@@ -223,19 +278,11 @@ class ClientDetailView(generics.RetrieveUpdateDestroyAPIView):
 #         return Response(status=status.HTTP_204_NO_CONTENT)
     
 
-class PaymentListView(generics.ListCreateAPIView):
+class PaymentListView(ReplicaReadMixin, RoleScopedMixin, SerializerPrefetchMixin, generics.ListCreateAPIView):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = (IsAuthenticated, PaymentPermission)
 
-    def get_queryset(self):
-        user = self.request.user
-        if user.role in ["Admin", "Manager"]:
-            return Payment.objects.all()
-        elif user.role == "Client":
-            return Payment.objects.filter(client=user.client)
-        return Payment.objects.none()
-
     def perform_create(self, serializer):
         user = self.request.user
         if user.role in ["Admin", "Manager"]:
@@ -245,7 +292,7 @@ class PaymentListView(generics.ListCreateAPIView):
             serializer.validated_data['status'] = "Waiting Approval"
         serializer.save(client=client)
 
-class PaymentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PaymentDetailView(ReplicaReadMixin, RoleScopedMixin, SerializerPrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = (IsAuthenticated, PaymentPermission)
@@ -267,21 +314,11 @@ class PaymentDetailView(generics.RetrieveUpdateDestroyAPIView):
 # client.media_buyer = User.objects.filter(pk=media_buyer_id).first() if media_buyer_data else None
 
 
-class ProductListView(generics.ListCreateAPIView):
+class ProductListView(ReplicaReadMixin, RoleScopedMixin, SerializerPrefetchMixin, generics.ListCreateAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = (IsAuthenticated, ProductPermission)
 
-    def get_queryset(self):
-        user = self.request.user
-        if user.role in ["Admin", "Manager"]:
-            return Product.objects.all()
-        elif user.role == "Client":
-            return Product.objects.filter(client=user.client)
-        elif user.role == "Media Buyer":
-            return Product.objects.filter(media_buyer=user)
-        return Product.objects.none()
-    
     def perform_create(self, serializer):
         user = self.request.user
         if user.role == "Client":
@@ -292,7 +329,7 @@ class ProductListView(generics.ListCreateAPIView):
         serializer.validated_data['media_buyer'] = media_buyer
         serializer.save()
 
-class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ProductDetailView(ReplicaReadMixin, RoleScopedMixin, SerializerPrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = (IsAuthenticated, ProductPermission)
@@ -311,57 +348,142 @@ class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
         serializer.save()
 
 
-class CampaignListView(generics.ListCreateAPIView):
+class CampaignKPIMixin:
+    # Annotated per request, days_running depends on the date. Saved campaigns
+    # are read back so the response carries their new KPIs
+    def get_queryset(self):
+        return super().get_queryset().with_kpis()
+
+    def perform_create(self, serializer):
+        serializer.save()
+        serializer.instance = Campaign.objects.with_kpis().get(pk=serializer.instance.pk)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        serializer.instance = Campaign.objects.with_kpis().get(pk=serializer.instance.pk)
+
+
+class CampaignListView(ReplicaReadMixin, RoleScopedMixin, SerializerPrefetchMixin, CampaignKPIMixin, generics.ListCreateAPIView):
+    """
+    Filters on status, platform, client, media buyer, product and the KPIs
+    (?cpl__gt=5&status=Active) and sorts on the KPIs (?ordering=-cpl), in SQL.
+    """
     queryset = Campaign.objects.all()
     serializer_class = CampaignSerializer
-    permission_classes = (IsAuthenticated,)
+    permission_classes = (IsAuthenticated, CampaignPermission)
+    filter_backends = (LookupFilter, KeyedOrderingFilter)
+    filter_fields = {
+        'status': ('exact', 'in'),
+        'platform': ('exact', 'in'),
+        'client': ('exact',),
+        'media_buyer': ('exact',),
+        'product': ('exact',),
+        'cpl': ('gt', 'gte', 'lt', 'lte', 'isnull'),
+        'budget_utilization': ('gt', 'gte', 'lt', 'lte', 'isnull'),
+        'days_running': ('gt', 'gte', 'lt', 'lte'),
+    }
+    # days_running changes daily, so no index can serve sorting on it
+    ordering_fields = ('created_at', 'cpl', 'budget_utilization')
+    # Cursor pagination needs non-NULL keys, see CampaignQuerySet.with_kpis
+    ordering_keys = {
+        'cpl': 'cpl_order',
+        'budget_utilization': 'budget_utilization_order',
+    }
+
+    def perform_create(self, serializer):
+        # A media buyer's campaigns are their own, or they could not see them
+        if self.request.user.role == 'Media Buyer':
+            serializer.validated_data['media_buyer'] = self.request.user
+        super().perform_create(serializer)
 
-class CampaignDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CampaignDetailView(ReplicaReadMixin, RoleScopedMixin, SerializerPrefetchMixin, CampaignKPIMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Campaign.objects.all()
     serializer_class = CampaignSerializer
-    permission_classes = (IsAuthenticated,)
+    permission_classes = (IsAuthenticated, CampaignPermission)
+
+
+class CampaignDailyStatListView(ReplicaReadMixin, RoleScopedMixin, SerializerPrefetchMixin, generics.ListCreateAPIView):
+    """
+    GET lists daily stats (?campaign=<id>&start=<date>&end=<date>). POST takes a
+    JSON list of up to CAMPAIGN_STATS_MAX_ROWS {campaign, date, leads,
+    amount_spent} rows and upserts them, moving the campaign totals along.
+    """
+    queryset = CampaignDailyStat.objects.all()
+    serializer_class = CampaignDailyStatSerializer
+    permission_classes = (IsAuthenticated, CampaignStatPermission)
+    cursor_ordering = ('-date', '-id')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        filters = {'campaign': 'campaign_id', 'start': 'date__gte', 'end': 'date__lte'}
+        try:
+            for param, lookup in filters.items():
+                if params.get(param):
+                    queryset = queryset.filter(**{lookup: params[param]})
+        except ValidationError as error:
+            raise serializers.ValidationError({param: error.messages})
+        return queryset
+
+    def create(self, request):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({'error': 'Expected a list of daily stats.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > settings.CAMPAIGN_STATS_MAX_ROWS:
+            return Response({'error': f'At most {settings.CAMPAIGN_STATS_MAX_ROWS} rows per request.'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(data=rows, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        campaign_ids = {row['campaign_id'] for row in serializer.validated_data}
+        allowed = set(scope_queryset(Campaign.objects.filter(pk__in=campaign_ids), request.user).values_list('pk', flat=True))
+        unknown = campaign_ids - allowed
+        if unknown:
+            return Response({'campaign': [f'Unknown campaign {pk}.' for pk in sorted(map(str, unknown))]}, status=status.HTTP_400_BAD_REQUEST)
+
+        created, updated = CampaignDailyStat.upsert(serializer.validated_data)
+        return Response({'created': created, 'updated': updated}, status=status.HTTP_201_CREATED)
 
 
-class PageListView(generics.ListCreateAPIView):
+class PageListView(ReplicaReadMixin, RoleScopedMixin, SerializerPrefetchMixin, generics.ListCreateAPIView):
     queryset = Page.objects.all()
     serializer_class = PageSerializer
-    permission_classes = (IsAuthenticated,)
+    permission_classes = (IsAuthenticated, PagePermission)
     
     def perform_create(self, serializer):
         serializer.save(media_buyer=self.request.user)
 
-class PageDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PageDetailView(ReplicaReadMixin, RoleScopedMixin, SerializerPrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Page.objects.all()
     serializer_class = PageSerializer
-    permission_classes = (IsAuthenticated,)
+    permission_classes = (IsAuthenticated, PagePermission)
 
 
-class VoiceOverListView(generics.ListCreateAPIView):
+class VoiceOverListView(ReplicaReadMixin, RoleScopedMixin, SerializerPrefetchMixin, generics.ListCreateAPIView):
     queryset = VoiceOver.objects.all()
     serializer_class = VoiceOverSerializer
-    permission_classes = (IsAuthenticated,)
+    permission_classes = (IsAuthenticated, VoiceOverPermission)
     
     def perform_create(self, serializer):
         serializer.save(media_buyer=self.request.user)
 
-class VoiceOverDetailView(generics.RetrieveUpdateDestroyAPIView):
+class VoiceOverDetailView(ReplicaReadMixin, RoleScopedMixin, SerializerPrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = VoiceOver.objects.all()
     serializer_class = VoiceOverSerializer
-    permission_classes = (IsAuthenticated,)
+    permission_classes = (IsAuthenticated, VoiceOverPermission)
 
 
-class CreativeListView(generics.ListCreateAPIView):
+class CreativeListView(ReplicaReadMixin, RoleScopedMixin, SerializerPrefetchMixin, generics.ListCreateAPIView):
     queryset = Creative.objects.all()
     serializer_class = CreativeSerializer
-    permission_classes = (IsAuthenticated,)
+    permission_classes = (IsAuthenticated, CreativePermission)
     
     def perform_create(self, serializer):
         serializer.save(media_buyer=self.request.user)
 
-class CreativeDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CreativeDetailView(ReplicaReadMixin, RoleScopedMixin, SerializerPrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Creative.objects.all()
     serializer_class = CreativeSerializer
-    permission_classes = (IsAuthenticated,)
+    permission_classes = (IsAuthenticated, CreativePermission)
 
 
 # class PageView(APIView):
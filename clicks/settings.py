@@ -14,23 +14,43 @@ from datetime import timedelta
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
-# Quick-start development settings - unsuitable for production
+# Development defaults; set DJANGO_ENV=production for the production profile
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
 
+PRODUCTION = os.environ.get("DJANGO_ENV") == "production"
+
+
+def env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes")
+
+
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "django-insecure-hivw7)v)@nlj!w@f35au=0@rsl)b!gpjq((h(ugspa4lhu5s19"
+SECRET_KEY = os.environ.get("DJANGO_SECRET_KEY")
+if not SECRET_KEY:
+    if PRODUCTION:
+        raise ImproperlyConfigured("DJANGO_SECRET_KEY must be set when DJANGO_ENV=production")
+    SECRET_KEY = "django-insecure-hivw7)v)@nlj!w@f35au=0@rsl)b!gpjq((h(ugspa4lhu5s19"
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# With DEBUG on Django also keeps every executed query in connection.queries,
+# so a long-running worker grows with traffic.
+DEBUG = env_bool("DJANGO_DEBUG", not PRODUCTION)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get("DJANGO_ALLOWED_HOSTS", "").split(",") if host]
+if PRODUCTION and not ALLOWED_HOSTS:
+    # With DEBUG off an empty list rejects every request with a 400
+    raise ImproperlyConfigured("DJANGO_ALLOWED_HOSTS must be set when DJANGO_ENV=production")
 
 CORS_ORIGIN_ALLOW_ALL = True
 
+CORS_EXPOSE_HEADERS = ["Server-Timing", "X-Query-Count"]
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -48,6 +68,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
+    "api.middleware.QueryTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -59,22 +80,87 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'api.authentication.CachedJWTAuthentication',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': 50,
+    # Token buckets of api.throttling on /api/token, kept in the ThrottleBucket
+    # table and checked before the password is hashed
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.environ.get("LOGIN_THROTTLE_IP", "20/min"),
+        'login_email': os.environ.get("LOGIN_THROTTLE_EMAIL", "5/min"),
+    },
+    # Proxies in front of the app that append to X-Forwarded-For. With 0 the
+    # throttles key on REMOTE_ADDR; left unset DRF would trust whatever
+    # X-Forwarded-For the client sends
+    'NUM_PROXIES': int(os.environ.get("NUM_PROXIES", 0)),
 }
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
-    'BLACKLIST_AFTER_ROTATION': True
+    'BLACKLIST_AFTER_ROTATION': True,
+    # Rotated tokens are revoked through api.blacklist, not the token_blacklist app
+    'TOKEN_REFRESH_SERIALIZER': 'api.blacklist.RevocableTokenRefreshSerializer',
 }
 
+# How often each process rebuilds its Bloom filter of revoked refresh tokens
+# and prunes expired ones
+TOKEN_BLACKLIST_RELOAD_SECONDS = int(os.environ.get("TOKEN_BLACKLIST_RELOAD_SECONDS", 300))
+
+# How often each process deletes the login throttle buckets that are full again
+THROTTLE_PRUNE_SECONDS = int(os.environ.get("THROTTLE_PRUNE_SECONDS", 60))
+
+# Users authenticated by api.authentication.CachedJWTAuthentication kept per
+# process; the TTL bounds how long other workers see a role change late
+AUTH_USER_CACHE_SIZE = int(os.environ.get("AUTH_USER_CACHE_SIZE", 4096))
+AUTH_USER_CACHE_TTL = int(os.environ.get("AUTH_USER_CACHE_TTL", 30))
+
+# Requests over either budget are logged by api.middleware.QueryTimingMiddleware
+QUERY_BUDGET_COUNT = int(os.environ.get("QUERY_BUDGET_COUNT", 20))
+QUERY_BUDGET_MS = float(os.environ.get("QUERY_BUDGET_MS", 200))
+
 ROOT_URLCONF = "clicks.urls"
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# How api.media.MediaView hands files to the front proxy: "x-accel-redirect"
+# (nginx, internal location MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT),
+# "x-sendfile" (Apache/lighttpd), or empty to stream from Django
+MEDIA_SENDFILE = os.environ.get("MEDIA_SENDFILE", "")
+MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/internal-media/")
+
+# Threads resizing uploaded product images in the background (api.images)
+IMAGE_VARIANT_WORKERS = int(os.environ.get("IMAGE_VARIANT_WORKERS", 2))
+
+# Largest batch accepted by POST /api/campaign-stats
+CAMPAIGN_STATS_MAX_ROWS = int(os.environ.get("CAMPAIGN_STATS_MAX_ROWS", 10000))
+
+# /api/reports (api.reports): largest number of groups returned, and how long
+# a result is cached when no write to its tables invalidates it first
+REPORT_MAX_ROWS = int(os.environ.get("REPORT_MAX_ROWS", 5000))
+REPORT_CACHE_TTL = int(os.environ.get("REPORT_CACHE_TTL", 60 * 60))
+
+# Ad platform sync (api.platform_sync): Campaign.platform -> adapter class
+PLATFORM_SYNC_ADAPTERS = {
+    'Stub': 'api.platform_sync.StubPlatformAdapter',
+}
+PLATFORM_SYNC_STUB_URL = os.environ.get("PLATFORM_SYNC_STUB_URL", "http://127.0.0.1:8765")
+PLATFORM_SYNC_CONCURRENCY = int(os.environ.get("PLATFORM_SYNC_CONCURRENCY", 20))
+PLATFORM_SYNC_RETRIES = int(os.environ.get("PLATFORM_SYNC_RETRIES", 4))
+PLATFORM_SYNC_BACKOFF = float(os.environ.get("PLATFORM_SYNC_BACKOFF", 0.5))
+PLATFORM_SYNC_TIMEOUT = float(os.environ.get("PLATFORM_SYNC_TIMEOUT", 10))
+PLATFORM_SYNC_BATCH_SIZE = int(os.environ.get("PLATFORM_SYNC_BATCH_SIZE", 500))
+
+# Chunked uploads (api.uploads) are assembled here before being stored; it
+# must be shared by every worker serving the API
+UPLOAD_SESSION_ROOT = os.environ.get("UPLOAD_SESSION_ROOT", os.path.join(BASE_DIR, 'upload_sessions'))
+UPLOAD_SESSION_MAX_SIZE = int(os.environ.get("UPLOAD_SESSION_MAX_SIZE", 200 * 1024 * 1024))
+# Sessions idle for longer are removed by gc_media
+UPLOAD_SESSION_TTL = int(os.environ.get("UPLOAD_SESSION_TTL", 24 * 60 * 60))
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -101,9 +187,83 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Keep connections open between requests in production
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 600 if PRODUCTION else 0)),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+if os.environ.get("POSTGRES_DB"):
+    DATABASES["default"].update({
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ["POSTGRES_DB"],
+        "USER": os.environ.get("POSTGRES_USER", ""),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+        "HOST": os.environ.get("POSTGRES_HOST", ""),
+        "PORT": os.environ.get("POSTGRES_PORT", ""),
+    })
+
+# Optional read replica used by api.routers.ReplicaRouter: a PostgreSQL host, or
+# for SQLite another database file. Tests run it as a mirror of default.
+if os.environ.get("DB_REPLICA"):
+    replica_key = "HOST" if os.environ.get("POSTGRES_DB") else "NAME"
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        replica_key: os.environ["DB_REPLICA"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["api.routers.ReplicaRouter"]
+
+# How long a user keeps reading from the primary after a write
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
+# Applied to every new SQLite connection by api.signals. WAL lets readers run
+# alongside the writer, and busy_timeout makes writers wait for the lock
+# instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "wal"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "normal"),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", -64000)),
+    "temp_store": os.environ.get("SQLITE_TEMP_STORE", "memory"),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Throttle buckets, read-your-writes pins, report results and table versions
+# all live here, so the default of 300 entries would cull them constantly.
+# FileBasedCache lists its whole directory on every set to decide whether to
+# cull, which makes each write cost more the higher its limit is
+CACHE_MAX_ENTRIES = os.environ.get("CACHE_MAX_ENTRIES")
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+elif PRODUCTION:
+    # Shared by every worker process on the host
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_DIR", BASE_DIR / "cache"),
+            "OPTIONS": {"MAX_ENTRIES": int(CACHE_MAX_ENTRIES or 2000)},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": int(CACHE_MAX_ENTRIES or 50000)},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -146,4 +306,22 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
-AUTH_USER_MODEL = "api.User"
\ No newline at end of file
+AUTH_USER_MODEL = "api.User"
+
+
+# Logging
+# https://docs.djangoproject.com/en/4.2/topics/logging/
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "api": {
+            "handlers": ["console"],
+            "level": os.environ.get("API_LOG_LEVEL", "INFO"),
+        },
+    },
+}
@@ -17,9 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from api.media import MediaView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("api/", include("api.urls"))
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path("api/", include("api.urls")),
+    # Permission checks happen here, the transfer itself is handed to the front
+    # proxy when MEDIA_SENDFILE is set
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:name>", MediaView.as_view(), name="media"),
+]